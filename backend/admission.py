@@ -0,0 +1,144 @@
+import asyncio
+import math
+import os
+import time
+
+import metrics
+
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "16"))
+
+QUEUE_WAIT_SECONDS = metrics.REGISTRY.histogram(
+    "agent_admission_wait_seconds",
+    "Time jobs spent queued before being admitted."
+)
+JOBS_REJECTED = metrics.REGISTRY.counter("agent_admission_rejected_total", "Jobs rejected because the queue was full.")
+JOBS_RUNNING = metrics.REGISTRY.gauge("agent_jobs_running", "Jobs currently holding an admission slot.")
+JOBS_QUEUED = metrics.REGISTRY.gauge("agent_jobs_queued", "Jobs waiting for an admission slot.")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many jobs in flight, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    def __init__(self):
+        self.created = time.perf_counter()
+        self.granted_at = None
+        self.released = False
+
+    @property
+    def granted(self):
+        return self.granted_at is not None
+
+
+class AdmissionController:
+    """
+    Limits how many jobs run at once. Jobs beyond the limit wait in a bounded FIFO queue;
+    once the queue is full, new jobs are rejected straight away with a Retry-After estimate.
+    """
+
+    def __init__(self, limit=MAX_CONCURRENT_JOBS, queue_size=MAX_QUEUED_JOBS):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.running = 0
+        self.queue = []
+        self.admitted = 0
+        self.rejected = 0
+        # Running estimate of how long a job holds its slot, used for Retry-After
+        self.avg_job_seconds = 60.0
+        self._changed = asyncio.Condition()
+
+    def enter(self):
+        """Takes a slot or a queue position for a new job; raises AdmissionRejected when both are exhausted."""
+        ticket = Ticket()
+        if self.running < self.limit and not self.queue:
+            self._grant(ticket)
+        elif len(self.queue) < self.queue_size:
+            self.queue.append(ticket)
+        else:
+            self.rejected += 1
+            JOBS_REJECTED.inc()
+            raise AdmissionRejected(self.retry_after())
+        self._update_gauges()
+        return ticket
+
+    async def enter_when_possible(self, cancelled=lambda: False, poll_interval=1.0):
+        """
+        Like enter(), but waits for room in the queue instead of rejecting. Used for batch
+        children, which would otherwise flood the queue and be turned away. Returns None if cancelled.
+        """
+        while not cancelled():
+            async with self._changed:
+                if len(self.queue) < self.queue_size:
+                    return self.enter()
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: len(self.queue) < self.queue_size),
+                        timeout=poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        return None
+
+    def retry_after(self):
+        waves = (len(self.queue) + 1) / max(self.limit, 1)
+        return max(1, math.ceil(self.avg_job_seconds * waves))
+
+    def position(self, ticket):
+        return self.queue.index(ticket) + 1 if ticket in self.queue else 0
+
+    async def wait(self, ticket, cancelled=lambda: False, poll_interval=1.0):
+        """Yields the ticket's queue position each time it changes, until the job is admitted or cancelled."""
+        last = None
+        while not ticket.granted and not cancelled():
+            position = self.position(ticket)
+            if position != last:
+                last = position
+                yield position
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: ticket.granted or self.position(ticket) != last),
+                        timeout=poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, ticket):
+        async with self._changed:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self.running -= 1
+                held = time.perf_counter() - ticket.granted_at
+                self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * held
+            elif ticket in self.queue:
+                self.queue.remove(ticket)
+            while self.running < self.limit and self.queue:
+                self._grant(self.queue.pop(0))
+            self._update_gauges()
+            self._changed.notify_all()
+
+    def _grant(self, ticket):
+        ticket.granted_at = time.perf_counter()
+        self.running += 1
+        self.admitted += 1
+        QUEUE_WAIT_SECONDS.observe(ticket.granted_at - ticket.created)
+
+    def _update_gauges(self):
+        JOBS_RUNNING.set(self.running)
+        JOBS_QUEUED.set(len(self.queue))
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "running": self.running,
+            "queued": len(self.queue),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
@@ -1,33 +1,164 @@
 import json
 import re
 
-MODEL_NAME="gemma2-9b-it"
+import blob_cache
+import cancellation
+import cassette
+import logs
+import metrics
+import progress
+import repo_maps
+import scanner
+import script_check
+import windows
+from llm import chat
+from sandbox import run_code
+
+def read_file(sbx, repo_dir, filename, sha=None):
+    """
+    Returns the content of a file in the clone. When its blob SHA is known the shared blob cache
+    is tried first, so unchanged files are transferred out of the sandbox only once per host.
+    """
+    blobs = blob_cache.shared()
+    # Recorded jobs must contain every file read, so cassettes skip the cache
+    if cassette.current() is not None:
+        sha = None
+    if sha:
+        content = blobs.get(sha)
+        if content is not None:
+            return content
+    with metrics.stage("file_read"):
+        execution = run_code(sbx, f"!( cd {repo_dir} && cat {filename} )")
+    content = "".join(execution.logs.stdout)
+    # Only cache what provably is the blob, not e.g. a read error
+    if sha and blob_cache.blob_sha(content) == sha:
+        blobs.put(sha, content)
+    return content
+
+def generate_modification_script(client, edit_prompt, filename, file_path, file_content):
+    """
+    Asks the LLM for a script that applies the edit to the whole file, repairing it when it fails
+    the host-side precheck. Returns (script or None, sandbox executions avoided).
+    """
+    file_type = filename.split('.')[-1].lower()
+    lang_desc = {
+        "py": "a Python file",
+        "js": "a JavaScript file",
+        "css": "a CSS file",
+        "html": "an HTML file",
+        "md": "a Markdown file",
+    }.get(file_type, f"a .{file_type} file")
+
+    mod_system_prompt = f"""
+You're a code-editing assistant.
+
+Generate a Python script that:
+- Opens the file {file_path}
+- Applies the user's edit as described
+- Overwrites the file
+- Prints 'Modification successful!'
 
-def identify_and_modify_file(edit_prompt, sbx, client, repo_dir):
+Only modify what's necessary. Use string search logic, not hardcoded line numbers.
 
-    print("\n📂 Scanning repo files...")
-    file_listing = sbx.run_code(f"!( cd {repo_dir} && find . -type f )")
-    repo_files = [f.strip().lstrip("./") for f in file_listing.logs.stdout if not f.endswith(".git")]
+This file is {lang_desc}.
+""".strip()
+
+    mod_user_prompt = f"""
+File content:
+{file_content}
+
+User request:
+{edit_prompt}
+""".strip()
+
+    messages = [
+        {"role": "system", "content": mod_system_prompt},
+        {"role": "user", "content": mod_user_prompt}
+    ]
+    with metrics.stage("file_generation"):
+        response = chat(client, messages, stage="modify_file")
+    modification_code = script_check.extract_script(response.choices[0].message.content)
+
+    # Check the script on the host first; a broken one would only fail after a sandbox round trip
+    problem = script_check.precheck(modification_code, file_path, file_content)
+    attempts = 0
+    avoided = 0
+    while problem and attempts < script_check.SCRIPT_REPAIR_ATTEMPTS:
+        attempts += 1
+        avoided += 1
+        script_check.EXECUTIONS_AVOIDED.inc()
+        progress.emit("script_repair", f"🩹 Generated script for {filename} rejected ({problem}), asking for a fix", file=filename, problem=problem, attempt=attempts)
+        messages += [
+            {"role": "assistant", "content": response.choices[0].message.content},
+            {"role": "user", "content": script_check.repair_prompt(problem)}
+        ]
+        with metrics.stage("script_repair"):
+            response = chat(client, messages, stage="repair_script")
+        modification_code = script_check.extract_script(response.choices[0].message.content)
+        problem = script_check.precheck(modification_code, file_path, file_content)
+
+    if problem:
+        avoided += 1
+        script_check.EXECUTIONS_AVOIDED.inc()
+        script_check.SCRIPT_PRECHECKS.inc(result="rejected")
+        progress.emit("file_error", f"⚠️ Skipping {filename}: generated script still invalid ({problem})", file=filename, error=problem)
+        return None, avoided
+    script_check.SCRIPT_PRECHECKS.inc(result="repaired" if attempts else "ok")
+    return modification_code, avoided
+
+def identify_and_modify_file(edit_prompt, sbx, client, repo_dir, cache=None, map_key=None):
+    """
+    Plans and applies `edit_prompt` to the clone in `repo_dir`. `cache` (a session's
+    {"scan": ...}) holds the scan of the base commit; it is reused when present and filled in otherwise.
+    `map_key` (owner/repo@sha of the clean checkout) looks the scan up in the shared repo map cache first.
+    """
+    cached = None
+    # Recorded jobs must contain the scan, so cassettes skip the shared repo maps
+    if cassette.current() is not None:
+        map_key = None
+    if cache is not None and cache["scan"] is not None:
+        repo_scan, cached = cache["scan"], "session"
+    elif map_key and (repo_scan := repo_maps.shared().get(map_key)) is not None:
+        cached = "repo_map"
+    else:
+        logs.debug("scan_started", "📂 Scanning repo files...")
+        with metrics.stage("scan"):
+            repo_scan = scanner.scan(sbx, repo_dir)
+        if map_key:
+            repo_maps.shared().put(map_key, repo_scan)
+    if cache is not None:
+        cache["scan"] = repo_scan
+    repo_files = list(repo_scan.files)
+    # Files written by this prompt no longer match their blob in the scan
+    touched = set()
+    # Sandbox runs of scripts that failed the host-side precheck and were never dispatched
+    avoided = 0
 
     if not repo_files:
-        print("❌ No files found in repository.")
+        progress.emit("error", "❌ No files found in repository.")
         return
+    if cached:
+        source = map_key if cached == "repo_map" else "the session's base commit"
+        message = f"📂 Found {len(repo_files)} files in repository (reused the scan of {source})"
+    else:
+        message = f"📂 Found {len(repo_files)} files in repository ({repo_scan.pruned_count} pruned, {repo_scan.seconds}s)"
+    progress.emit("scan", message, cached=cached, **repo_scan.summary())
 
     # Step 1: Use LLM to decide which files to create or modify
-    print("🧠 LLM analyzing intent and repo file list...")
+    progress.emit("routing_started", "🧠 LLM analyzing intent and repo file list...")
 
     routing_prompt = f"""
 You are a smart assistant for a code-editing agent.
 
 Given:
 - A user prompt describing a desired change.
-- A list of files in a repository.
+- The files of a repository as a tree, with line counts.
 
 Your job:
 - Identify any files that need to be **created**
 - Identify any files that need to be **modified**
 
-Respond ONLY with this JSON format:
+Use full paths from the repository root. Respond ONLY with this JSON format:
 {{
   "create": [
     {{"file": "relative/path.js", "reason": "why this file is created"}}
@@ -41,25 +172,38 @@ User prompt:
 {edit_prompt}
 
 Repo files:
-{chr(10).join(repo_files)}
+{repo_scan.tree()}
     """
 
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
-            {"role": "system", "content": "You are a code modification planner."},
-            {"role": "user", "content": routing_prompt.strip()}
-        ]
-    )
+    with metrics.stage("routing_llm"):
+        response = chat(
+            client,
+            [
+                {"role": "system", "content": "You are a code modification planner."},
+                {"role": "user", "content": routing_prompt.strip()}
+            ],
+            stage="routing"
+        )
 
     match = re.search(r"\{.*\}", response.choices[0].message.content, re.DOTALL)
     decision_json = json.loads(match.group()) if match else {"create": [], "modify": []}
 
+    planned = len(decision_json.get("create", [])) + len(decision_json.get("modify", []))
+    progress.emit(
+        "routing", f"🗺️ Plan: create {len(decision_json.get('create', []))}, modify {len(decision_json.get('modify', []))} file(s)",
+        create=decision_json.get("create", []), modify=decision_json.get("modify", [])
+    )
+    metrics.set_job_labels(
+        repo_size=metrics.repo_size_bucket(len(repo_files)),
+        file_count=metrics.file_count_bucket(planned)
+    )
+
     # Step 2: File Creation
     for entry in decision_json.get("create", []):
+        cancellation.check()
         filename = entry["file"]
         reason = entry.get("reason", "unspecified")
-        print(f"\n📁 Creating new file: {filename} — {reason}")
+        progress.emit("file_started", f"📁 Creating new file: {filename} — {reason}", file=filename, action="create", reason=reason)
 
         create_prompt = f"""
 User prompt:
@@ -70,13 +214,15 @@ Reason: {reason}
 Give the entire content of the file in a Python string.
 """
 
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": "You are a code generator that writes full file content."},
-                {"role": "user", "content": create_prompt.strip()}
-            ]
-        )
+        with metrics.stage("file_generation"):
+            response = chat(
+                client,
+                [
+                    {"role": "system", "content": "You are a code generator that writes full file content."},
+                    {"role": "user", "content": create_prompt.strip()}
+                ],
+                stage="create_file"
+            )
 
         file_content = response.choices[0].message.content.strip()
         if "```" in file_content:
@@ -86,94 +232,76 @@ Give the entire content of the file in a Python string.
     f.write({json.dumps(file_content)})
 print("File created: {filename}")
 """
-        sbx.run_code(write_code)
+        with metrics.stage("script_exec"):
+            execution = run_code(sbx, write_code)
+        touched.add(filename)
+        if execution.logs.stderr:
+            progress.emit("file_error", f"⚠️ Errors while creating {filename}", file=filename, error="".join(execution.logs.stderr)[-500:])
 
         # Optional: show created content
-        verify = sbx.run_code(f"!( cd {repo_dir} && cat {filename} )")
-        print(f"\n📄 Created {filename}:")
-        for line in verify.logs.stdout:
-            print(line)
+        verify = run_code(sbx, f"!( cd {repo_dir} && cat {filename} )")
+        logs.debug("file_content", f"📄 Created {filename}", payload=verify.logs.stdout, sampled=True, file=filename)
+        progress.emit(
+            "file_finished", f"✅ Created {filename}", file=filename, action="create",
+            changed=bool(verify.logs.stdout), additions=len("".join(verify.logs.stdout).splitlines()), deletions=0
+        )
 
     # Step 3: Modify existing files
     for entry in decision_json.get("modify", []):
-        filename = entry["file"]
+        cancellation.check()
+        filename = repo_scan.resolve(entry["file"])
         file_path = f"{repo_dir}/{filename}"
 
-        print(f"\n📝 Modifying file: {filename} — {entry.get('reason', 'unspecified')}")
+        reason = entry.get("reason", "unspecified")
+        progress.emit("file_started", f"📝 Modifying file: {filename} — {reason}", file=filename, action="modify", reason=reason)
 
-        read_command = f"!( cd {repo_dir} && cat {filename} )"
-        execution = sbx.run_code(read_command)
-        file_content = "".join(execution.logs.stdout)
+        file_content = read_file(sbx, repo_dir, filename, None if filename in touched else repo_scan.sha(filename))
 
         if not file_content.strip():
-            print(f"⚠️ Skipping empty or unreadable file: {filename}")
+            progress.emit("file_error", f"⚠️ Skipping empty or unreadable file: {filename}", file=filename, error="empty or unreadable")
             continue
 
-        file_type = filename.split('.')[-1].lower()
-        lang_desc = {
-            "py": "a Python file",
-            "js": "a JavaScript file",
-            "css": "a CSS file",
-            "html": "an HTML file",
-            "md": "a Markdown file",
-        }.get(file_type, f"a .{file_type} file")
-
-        mod_system_prompt = f"""
-You're a code-editing assistant.
-
-Generate a Python script that:
-- Opens the file {file_path}
-- Applies the user's edit as described
-- Overwrites the file
-- Prints 'Modification successful!'
-
-Only modify what's necessary. Use string search logic, not hardcoded line numbers.
-
-This file is {lang_desc}.
-""".strip()
-
-        mod_user_prompt = f"""
-File content:
-{file_content}
-
-User request:
-{edit_prompt}
-""".strip()
-
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": mod_system_prompt},
-                {"role": "user", "content": mod_user_prompt}
-            ]
-        )
-
-        modification_code = response.choices[0].message.content
-        if "```python" in modification_code:
-            modification_code = modification_code.split("```python")[1].split("```")[0]
-        elif "```" in modification_code:
-            modification_code = modification_code.split("```")[1]
+        modification_code = None
+        if windows.should_window(file_content):
+            # Too large to send whole: edit only the relevant windows and write the spliced result
+            new_content = windows.edit_in_windows(client, filename, file_content, edit_prompt, reason)
+            if new_content is not None:
+                modification_code = f"""with open({json.dumps(file_path)}, 'w') as f:
+    f.write({json.dumps(new_content)})
+print('Modification successful!')
+"""
+        if modification_code is None:
+            modification_code, skipped_runs = generate_modification_script(client, edit_prompt, filename, file_path, file_content)
+            avoided += skipped_runs
+            if modification_code is None:
+                continue
 
-        print(f"\n🧾 Generated modification script:\n{modification_code}")
+        logs.debug("script", f"🧾 Generated modification script for {filename}", payload=modification_code, sampled=True, file=filename)
 
-        execution = sbx.run_code(modification_code)
+        with metrics.stage("script_exec"):
+            execution = run_code(sbx, modification_code)
+        touched.add(filename)
 
         if execution.logs.stderr:
-            print("⚠️ Errors during modification:")
-            for log in execution.logs.stderr:
-                print(log)
+            progress.emit("file_error", f"⚠️ Errors during modification of {filename}", file=filename, error="".join(execution.logs.stderr)[-500:])
 
         # Git diff
-        diff_check = sbx.run_code(f"!( cd {repo_dir} && git diff {filename} )")
+        with metrics.stage("diff"):
+            diff_check = run_code(sbx, f"!( cd {repo_dir} && git diff {filename} )")
+        stats = progress.diff_stats(diff_check.logs.stdout)
         if diff_check.logs.stdout:
-            print(f"\n✅ File changed: {filename}")
-            for line in diff_check.logs.stdout:
-                print(line)
+            logs.debug("diff", f"🔍 Diff of {filename}", payload=diff_check.logs.stdout, sampled=True, file=filename)
+            progress.emit(
+                "file_finished", f"✅ File changed: {filename} (+{stats['additions']} -{stats['deletions']})",
+                file=filename, action="modify", changed=True, **stats
+            )
         else:
-            print(f"\n❌ No changes detected in {filename}.")
+            progress.emit("file_finished", f"❌ No changes detected in {filename}.", file=filename, action="modify", changed=False, **stats)
+
+        # Reading the final content back costs a sandbox round trip, so only do it when it will be logged
+        if logs.enabled("DEBUG"):
+            final = run_code(sbx, f"!( cd {repo_dir} && cat {filename} )")
+            logs.debug("file_content", f"📄 Final content of {filename}", payload=final.logs.stdout, sampled=True, file=filename)
 
-        # Final content
-        final = sbx.run_code(f"!( cd {repo_dir} && cat {filename} )")
-        print(f"\n📄 Final content of {filename}:")
-        for line in final.logs.stdout:
-            print(line)
+    if avoided:
+        progress.emit("precheck", f"🩹 Precheck avoided {avoided} failing sandbox execution(s)", executions_avoided=avoided)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import time
+
+import admission
+
+# How many repositories of one batch run at the same time (they also share the global admission limit)
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", str(admission.MAX_CONCURRENT_JOBS)))
+BATCH_MAX_REPOS = int(os.getenv("BATCH_MAX_REPOS", "100"))
+
+
+def parse_event(event):
+    """Turns one SSE event of a job into a dict with at least a "message" key."""
+    data = event[len("data: "):].strip() if event.startswith("data: ") else event.strip()
+    try:
+        parsed = json.loads(data)
+        if isinstance(parsed, dict):
+            return parsed
+    except ValueError:
+        pass
+    return {"message": data}
+
+
+def send(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+
+class RepoResult:
+    def __init__(self, repo_url):
+        self.repo_url = repo_url
+        self.job_id = None
+        self.status = "pending"
+        self.pr_url = None
+        self.error = None
+        self.started = None
+        self.seconds = None
+
+    def observe(self, event):
+        if "pr_url" in event:
+            self.status = "success"
+            self.pr_url = event["pr_url"]
+        message = str(event.get("message", ""))
+        if message.startswith("❌") and self.error is None:
+            self.error = message
+        elif message.startswith("🛑"):
+            self.status = "cancelled"
+
+    def to_dict(self):
+        return {
+            "repo": self.repo_url,
+            "job_id": self.job_id,
+            "status": self.status,
+            "pr_url": self.pr_url,
+            "error": self.error,
+            "seconds": self.seconds,
+        }
+
+
+async def run_batch(batch_job, repo_urls, start_job, follow, sandbox_pool, parallel=BATCH_MAX_PARALLEL):
+    """
+    Runs one job per repository, at most `parallel` at a time, and yields a single combined feed:
+    every child event tagged with its repo and job id, then a per-repo summary with throughput.
+
+    `start_job(repo_url)` returns (job, created), or None if the batch was cancelled first, and
+    `follow(job)` streams a job's events. Cancelling the batch cancels every child it started.
+    """
+    started = time.perf_counter()
+    results = [RepoResult(url) for url in repo_urls]
+    feed = asyncio.Queue()
+    gate = asyncio.Semaphore(parallel)
+
+    async def run_one(result):
+        async with gate:
+            if batch_job.cancel_scope.cancelled:
+                result.status = "cancelled"
+                return
+            result.started = time.perf_counter()
+            started_job = await start_job(result.repo_url)
+            if started_job is None:
+                result.status = "cancelled"
+                return
+            job, created = started_job
+            result.job_id = job.id
+            if created:
+                batch_job.cancel_scope.on_cancel(lambda: job.cancel_scope.cancel("batch cancelled"))
+            async for event in follow(job):
+                parsed = parse_event(event)
+                result.observe(parsed)
+                await feed.put({**parsed, "repo": result.repo_url, "job_id": job.id})
+            if result.status == "pending":
+                result.status = "failed"
+            result.seconds = round(time.perf_counter() - result.started, 3)
+
+    async def run_all():
+        try:
+            await asyncio.gather(*(run_one(r) for r in results))
+        finally:
+            await feed.put(None)
+
+    yield send({"message": f"📦 Batch started for {len(repo_urls)} repositories, {parallel} at a time", "repos": repo_urls})
+    runner = asyncio.create_task(run_all())
+    try:
+        while True:
+            event = await feed.get()
+            if event is None:
+                break
+            yield send(event)
+        await runner
+    finally:
+        if not runner.done():
+            batch_job.cancel_scope.cancel("batch stream closed")
+            runner.cancel()
+        sandbox_pool.close()
+
+    wall = time.perf_counter() - started
+    succeeded = sum(1 for r in results if r.status == "success")
+    yield send({
+        "message": f"📊 Batch finished: {succeeded}/{len(results)} pull requests in {wall:.1f}s",
+        "summary": [r.to_dict() for r in results],
+        "throughput": {
+            "repos": len(results),
+            "succeeded": succeeded,
+            "failed": sum(1 for r in results if r.status == "failed"),
+            "cancelled": sum(1 for r in results if r.status == "cancelled"),
+            "wall_seconds": round(wall, 3),
+            "repos_per_minute": round(len(results) / wall * 60, 2) if wall else 0.0,
+            "prs_per_minute": round(succeeded / wall * 60, 2) if wall else 0.0,
+        },
+        "sandbox_pool": sandbox_pool.stats(),
+    })
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+ZERO_SHA = "0" * 40
+GIT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "Benchmark",
+    "GIT_AUTHOR_EMAIL": "bench@localhost",
+    "GIT_COMMITTER_NAME": "Benchmark",
+    "GIT_COMMITTER_EMAIL": "bench@localhost",
+}
+
+
+def _git(repo, *args, check=True):
+    return subprocess.run(
+        ["git", "--git-dir", repo, *args],
+        capture_output=True, text=True, check=check
+    )
+
+
+class FakeGitHubServer:
+    """
+    Minimal GitHub REST and GraphQL server backed by bare repositories under `root`
+    (`{root}/{owner}/{repo}.git`), covering the endpoints and operations the agent uses.
+    Clone URLs for the sandbox are `file://{root}/{owner}/{repo}.git`.
+    """
+
+    def __init__(self, root, host="127.0.0.1", port=0, default_branch="main", labels=("bug", "enhancement", "automated")):
+        self.root = root
+        self.default_branch = default_branch
+        self.labels = list(labels)
+        self.pulls = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method):
+                server.requests += 1
+                length = int(self.headers.get("Content-Length", 0) or 0)
+                payload = json.loads(self.rfile.read(length) or b"null") if length else None
+                status, body, headers = server.handle(method, self.path, dict(self.headers), payload)
+                data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.clone_url = f"file://{root}/{{owner}}/{{repo}}.git"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def repo_path(self, owner, repo):
+        return os.path.join(self.root, owner, f"{repo}.git")
+
+    def create_repo(self, owner, repo, files):
+        """Creates a bare repository whose default branch holds `files` ({path: content})."""
+        path = self.repo_path(owner, repo)
+        with tempfile.TemporaryDirectory() as worktree:
+            for name, content in files.items():
+                full = os.path.join(worktree, name)
+                os.makedirs(os.path.dirname(full), exist_ok=True)
+                with open(full, "w") as f:
+                    f.write(content)
+            env = dict(os.environ, **GIT_IDENTITY)
+            run = lambda *args: subprocess.run(args, cwd=worktree, env=env, capture_output=True, check=True)
+            run("git", "init", "-q", "-b", self.default_branch)
+            run("git", "add", ".")
+            run("git", "commit", "-q", "-m", "Initial commit")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            run("git", "clone", "-q", "--bare", worktree, path)
+        return path
+
+    def handle(self, method, raw_path, headers, payload):
+        parsed = urlparse(raw_path)
+        query = parse_qs(parsed.query)
+        if method == "POST" and parsed.path == "/graphql":
+            return self._graphql(payload or {})
+        match = re.match(r"^/repos/([^/]+)/([^/]+)(/.*)?$", parsed.path)
+        if not match:
+            return 404, {"message": "Not Found"}, {}
+        owner, repo, rest = match.group(1), match.group(2), match.group(3) or ""
+        path = self.repo_path(owner, repo)
+        if not os.path.isdir(path):
+            return 404, {"message": "Not Found"}, {}
+
+        if method == "GET" and rest == "":
+            return 200, {"full_name": f"{owner}/{repo}", "default_branch": self.default_branch}, {}
+        if method == "GET" and rest == "/branches":
+            return self._branches(owner, repo, path, query, headers)
+        if method == "GET" and rest.startswith("/commits/"):
+            ref = rest[len("/commits/"):]
+            result = _git(path, "rev-parse", ref, check=False)
+            if result.returncode != 0:
+                return 422, {"message": "No commit found"}, {}
+            return 200, result.stdout.strip().encode("utf-8"), {"Content-Type": "text/plain"}
+        if method == "POST" and rest == "/git/refs":
+            with self._lock:
+                result = _git(path, "update-ref", payload["ref"], payload["sha"], ZERO_SHA, check=False)
+            if result.returncode != 0:
+                return 422, {"message": "Reference already exists"}, {}
+            return 201, {"ref": payload["ref"], "object": {"sha": payload["sha"]}}, {}
+        if method == "DELETE" and rest.startswith("/git/refs/"):
+            result = _git(path, "update-ref", "-d", "refs/" + rest[len("/git/refs/"):], check=False)
+            return (204, b"", {}) if result.returncode == 0 else (422, {"message": "Reference does not exist"}, {})
+        if method == "GET" and rest == "/pulls":
+            head = query.get("head", [""])[0].split(":")[-1]
+            return 200, [
+                pull for pull in self.pulls
+                if f"/{owner}/{repo}/pull/" in pull["html_url"] and (not head or pull["head"]["ref"] == head)
+            ], {}
+        if method == "POST" and rest == "/pulls":
+            return self._create_pull(owner, repo, path, payload)
+        return 404, {"message": "Not Found"}, {}
+
+    def _branches(self, owner, repo, path, query, headers):
+        refs = _git(path, "for-each-ref", "refs/heads", "--format=%(refname:short) %(objectname)").stdout.split("\n")
+        branches = [
+            {"name": name, "commit": {"sha": sha}}
+            for name, sha in (line.split(" ") for line in refs if line)
+        ]
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        body = branches[(page - 1) * per_page:page * per_page]
+
+        response_headers = {"Content-Type": "application/json"}
+        if page * per_page < len(branches):
+            response_headers["Link"] = (
+                f'<{self.url}/repos/{owner}/{repo}/branches?per_page={per_page}&page={page + 1}>; rel="next"'
+            )
+        etag = '"' + hashlib.sha1(json.dumps([body, response_headers]).encode("utf-8")).hexdigest() + '"'
+        response_headers["ETag"] = etag
+        if headers.get("If-None-Match") == etag:
+            return 304, b"", {"ETag": etag}
+        return 200, body, response_headers
+
+    def _create_pull(self, owner, repo, path, payload):
+        if _git(path, "rev-parse", "--verify", f"refs/heads/{payload['head']}", check=False).returncode != 0:
+            return 422, {"message": "Validation Failed", "errors": [{"field": "head", "code": "invalid"}]}, {}
+        with self._lock:
+            if any(f"/{owner}/{repo}/pull/" in pull["html_url"] and pull["head"]["ref"] == payload["head"] for pull in self.pulls):
+                return 422, {"message": f"A pull request already exists for {owner}:{payload['head']}."}, {}
+            number = len(self.pulls) + 1
+            pull = {
+                "number": number,
+                "node_id": f"PR_{number}",
+                "html_url": f"{self.url}/{owner}/{repo}/pull/{number}",
+                "head": {"ref": payload["head"]},
+                "base": {"ref": payload["base"]},
+                "title": payload.get("title", ""),
+                "draft": payload.get("draft", False),
+            }
+            self.pulls.append(pull)
+        return 201, pull, {}
+
+    def _graphql(self, payload):
+        """Answers the operations the PR publisher sends, told apart by their operation names."""
+        document = payload.get("query", "")
+        variables = payload.get("variables") or {}
+        operation = re.search(r"(?:query|mutation)\s+(\w+)", document)
+        name = operation.group(1) if operation else ""
+
+        if name == "RepositoryMetadata":
+            owner, repo = variables["owner"], variables["name"]
+            data = {"repository": None}
+            errors = []
+            if os.path.isdir(self.repo_path(owner, repo)):
+                data["repository"] = {
+                    "id": f"R_{owner}/{repo}",
+                    "defaultBranchRef": {"name": self.default_branch},
+                    "labels": {"nodes": [{"id": f"L_{label}", "name": label} for label in self.labels]},
+                }
+            else:
+                errors.append({"type": "NOT_FOUND", "message": f"Could not resolve to a Repository with the name '{owner}/{repo}'."})
+            for alias, variable in re.findall(r"(\w+): user\(login: \$(\w+)\)", document):
+                data[alias] = {"id": f"U_{variables[variable]}", "login": variables[variable]}
+            return 200, {"data": data, **({"errors": errors} if errors else {})}, {}
+
+        if name == "CreatePullRequest":
+            owner, repo = variables["repositoryId"][len("R_"):].split("/", 1)
+            status, pull, _ = self._create_pull(owner, repo, self.repo_path(owner, repo), {
+                "head": variables["head"], "base": variables["base"],
+                "title": variables["title"], "draft": variables.get("draft", False),
+            })
+            if status != 201:
+                return 200, {"data": None, "errors": [{"type": "UNPROCESSABLE", "message": pull["message"]}]}, {}
+            return 200, {"data": {"createPullRequest": {"pullRequest": {
+                "id": f"PR_{pull['number']}", "number": pull["number"], "url": pull["html_url"], "isDraft": pull["draft"],
+            }}}}, {}
+
+        if name == "DecoratePullRequest":
+            pull = self.pulls[int(variables["pullRequestId"][len("PR_"):]) - 1]
+            data = {}
+            if "labelIds" in variables:
+                pull["labels"] = [{"name": label_id[len("L_"):]} for label_id in variables["labelIds"]]
+                data["addLabelsToLabelable"] = {"clientMutationId": None}
+            if "userIds" in variables:
+                pull["requested_reviewers"] = [{"login": user_id[len("U_"):]} for user_id in variables["userIds"]]
+                data["requestReviews"] = {"clientMutationId": None}
+            return 200, {"data": data}, {}
+
+        return 200, {"data": None, "errors": [{"type": "UNKNOWN", "message": f"Unsupported operation {name!r}"}]}, {}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,133 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EDITABLE_EXTENSIONS = (".html", ".py", ".js", ".css", ".md")
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _tree_paths(tree):
+    """Turns the indented file tree of the routing prompt back into full paths."""
+    paths = []
+    stack = []
+    for line in tree.splitlines():
+        if not line.strip():
+            continue
+        depth = (len(line) - len(line.lstrip(" "))) // 2
+        name = line.strip()
+        del stack[depth:]
+        if name.endswith("/"):
+            stack.append(name)
+        else:
+            paths.append("".join(stack) + name.split(" (", 1)[0])
+    return paths
+
+
+def _route(user_prompt):
+    files = _tree_paths(user_prompt.split("Repo files:", 1)[-1])
+    targets = [name for name in files if name.endswith(EDITABLE_EXTENSIONS)][:1]
+    return json.dumps({
+        "create": [],
+        "modify": [{"file": name, "reason": "benchmark edit"} for name in targets],
+    })
+
+
+def _modification_script(system_prompt):
+    match = re.search(r"Opens the file (\S+)", system_prompt)
+    path = match.group(1) if match else ""
+    return f"""```python
+with open({path!r}) as f:
+    content = f.read()
+with open({path!r}, 'w') as f:
+    f.write(content + '\\n# benchmark edit\\n')
+print('Modification successful!')
+```"""
+
+
+def fake_completion(messages):
+    """Produces a plausible answer for each prompt the agent sends."""
+    system_prompt = messages[0]["content"] if messages else ""
+    user_prompt = messages[-1]["content"] if messages else ""
+    if "modification planner" in system_prompt:
+        return _route(user_prompt)
+    if "writes full file content" in system_prompt:
+        return "```\n<!-- generated by the benchmark -->\n```"
+    if "Opens the file" in system_prompt:
+        return _modification_script(system_prompt)
+    return "OK"
+
+
+class FakeLLMServer:
+    """
+    OpenAI-compatible chat completions server with a configurable first-token latency
+    and generation rate. Point GROQ_BASE_URL at `url` to use it.
+    """
+
+    def __init__(self, latency=0.5, tokens_per_second=200.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                body = server.complete(payload)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def complete(self, payload):
+        self.requests += 1
+        messages = payload.get("messages", [])
+        content = fake_completion(messages)
+        prompt_tokens = sum(_estimate_tokens(m.get("content", "")) for m in messages)
+        completion_tokens = _estimate_tokens(content)
+        delay = self.latency
+        if self.tokens_per_second:
+            delay += completion_tokens / self.tokens_per_second
+        time.sleep(delay)
+        return {
+            "id": f"chatcmpl-bench-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
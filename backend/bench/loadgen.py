@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+SSE load generator for the POST /code endpoint.
+
+Opens many concurrent /code streams with a constant or Poisson arrival process and reports
+time-to-first-event, inter-event gaps, completion latency and error rates. Periods where every
+open stream goes quiet at once are reported as event-loop stalls.
+
+Usage (from the backend directory):
+    python -m bench.loadgen --url http://localhost:8000 --rate 2 --requests 50 --arrival poisson \\
+        --repo-url https://github.com/bench/repo-0
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import aiohttp
+
+from bench.report import latency_summary, format_table
+
+
+class StallDetector:
+    """Tracks the last event seen on any stream and records intervals where all open streams were silent."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.active = 0
+        self.started = time.perf_counter()
+        self.last_event = self.started
+        self.stalls = []
+        self._stall_started = None
+
+    def stream_opened(self):
+        if self.active == 0:
+            self.last_event = time.perf_counter()
+        self.active += 1
+
+    def stream_closed(self):
+        self.active -= 1
+
+    def event(self):
+        now = time.perf_counter()
+        if self._stall_started is not None:
+            self._close_stall(now)
+        self.last_event = now
+
+    def _close_stall(self, now):
+        self.stalls[-1]["seconds"] = round(now - self._stall_started, 3)
+        self._stall_started = None
+
+    async def watch(self, interval=0.05):
+        while True:
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            if self.active and self._stall_started is None and now - self.last_event > self.threshold:
+                self._stall_started = self.last_event
+                self.stalls.append({"at": round(self.last_event - self.started, 3), "seconds": None, "open_streams": self.active})
+            elif not self.active and self._stall_started is not None:
+                self._close_stall(now)
+
+
+async def run_stream(session, url, payload, detector, timeout):
+    result = {"status": None, "ttfe": None, "gaps": [], "latency": None, "events": 0, "error": None}
+    started = time.perf_counter()
+    last = started
+    detector.stream_opened()
+    try:
+        async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            result["status"] = response.status
+            if response.status != 200:
+                result["error"] = f"HTTP {response.status}"
+                return result
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8", errors="replace").strip()
+                if not line.startswith("data:"):
+                    continue
+                now = time.perf_counter()
+                detector.event()
+                if result["ttfe"] is None:
+                    result["ttfe"] = now - started
+                else:
+                    result["gaps"].append(now - last)
+                last = now
+                result["events"] += 1
+                data = line[len("data:"):].strip()
+                message = data
+                if data.startswith("{"):
+                    try:
+                        message = json.loads(data).get("message", "")
+                    except ValueError:
+                        pass
+                if str(message).startswith("❌") and result["error"] is None:
+                    result["error"] = "agent error"
+            result["latency"] = time.perf_counter() - started
+    except asyncio.TimeoutError:
+        result["error"] = "timeout"
+    except aiohttp.ClientError as e:
+        result["error"] = type(e).__name__
+    finally:
+        detector.stream_closed()
+    return result
+
+
+def arrival_delays(rate, count, process, seed=None):
+    """Delays between successive request starts for a constant or Poisson arrival process."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield rng.expovariate(rate) if process == "poisson" else 1.0 / rate
+
+
+async def generate_load(args):
+    detector = StallDetector(args.stall_threshold)
+    watcher = asyncio.create_task(detector.watch())
+    connector = aiohttp.TCPConnector(limit=0)
+    tasks = []
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for i, delay in enumerate(arrival_delays(args.rate, args.requests, args.arrival, args.seed)):
+            payload = {"repoUrl": args.repo_url, "prompt": args.prompt.format(i=i)}
+            tasks.append(asyncio.create_task(
+                run_stream(session, f"{args.url.rstrip('/')}/code", payload, detector, args.timeout)
+            ))
+            await asyncio.sleep(delay)
+        results = await asyncio.gather(*tasks)
+    watcher.cancel()
+    return results, time.perf_counter() - started, detector.stalls
+
+
+def summarize(results, wall_seconds, stalls):
+    errors = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    completed = [r for r in results if r["latency"] is not None and not r["error"]]
+    gaps = [gap for r in results for gap in r["gaps"]]
+    closed_stalls = [s for s in stalls if s["seconds"] is not None]
+    return {
+        "requests": len(results),
+        "completed": len(completed),
+        "error_rate": round(sum(errors.values()) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "time_to_first_event": latency_summary([r["ttfe"] for r in results if r["ttfe"] is not None]),
+        "inter_event_gap": latency_summary(gaps),
+        "completion_latency": latency_summary([r["latency"] for r in completed]),
+        "stalls": {
+            "count": len(stalls),
+            "total_seconds": round(sum(s["seconds"] for s in closed_stalls), 3),
+            "longest_seconds": max((s["seconds"] for s in closed_stalls), default=0.0),
+            "events": stalls[:20],
+        },
+    }
+
+
+def render(summary):
+    rows = []
+    for name in ("time_to_first_event", "inter_event_gap", "completion_latency"):
+        s = summary[name]
+        rows.append([name, s["count"], s["p50"], s["p95"], s["p99"], s["max"]])
+    stalls = summary["stalls"]
+    return "\n".join([
+        f"Requests: {summary['requests']}, completed: {summary['completed']}, "
+        f"error rate: {summary['error_rate']:.2%} {summary['errors'] or ''}",
+        format_table(["metric (s)", "count", "p50", "p95", "p99", "max"], rows),
+        f"Stalls (all streams quiet): {stalls['count']}, total {stalls['total_seconds']}s, "
+        f"longest {stalls['longest_seconds']}s",
+    ])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SSE load generator for POST /code")
+    parser.add_argument("--url", default="http://localhost:8000", help="base URL of the agent server")
+    parser.add_argument("--repo-url", required=True, help="repoUrl sent with every request")
+    parser.add_argument("--prompt", default="Load test change #{i}", help="prompt template; {i} is the request index")
+    parser.add_argument("--requests", type=int, default=20, help="total number of streams to open")
+    parser.add_argument("--rate", type=float, default=1.0, help="mean arrivals per second")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant")
+    parser.add_argument("--seed", type=int, help="random seed for Poisson arrivals")
+    parser.add_argument("--timeout", type=float, default=600.0, help="per-stream timeout in seconds")
+    parser.add_argument("--stall-threshold", type=float, default=1.0,
+                        help="seconds of silence across all open streams that count as a stall")
+    parser.add_argument("--json", dest="json_path", help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results, wall_seconds, stalls = asyncio.run(generate_load(args))
+    summary = summarize(results, wall_seconds, stalls)
+    print(render(summary))
+    print(json.dumps(summary, indent=2))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+SHELL_PREFIX = "!("
+
+
+class LocalFiles:
+    """The subset of the E2B filesystem API the agent uses; relative paths are inside the sandbox's directory."""
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+
+    def write(self, path, data):
+        path = os.path.join(self.workdir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            if hasattr(data, "read"):
+                shutil.copyfileobj(data, f)
+            else:
+                f.write(data.encode("utf-8") if isinstance(data, str) else data)
+
+    def read(self, path, format="text"):
+        with open(os.path.join(self.workdir, path), "rb") as f:
+            data = f.read()
+        return data if format == "bytes" else data.decode("utf-8")
+
+
+class LocalSandbox:
+    """
+    Stand-in for the E2B sandbox that runs code in a scratch directory on this machine.
+    Shell cells (`!( ... )`) merge stderr into stdout the way the Jupyter kernel does.
+    Only meant for benchmarks against the fake LLM, which generates trusted scripts.
+    """
+
+    def __init__(self, root=None, timeout=180):
+        self.workdir = tempfile.mkdtemp(prefix="sandbox-", dir=root)
+        self.timeout = timeout
+        self.files = LocalFiles(self.workdir)
+        self.env = dict(
+            os.environ,
+            GIT_TERMINAL_PROMPT="0",
+            GIT_AUTHOR_NAME="Backspace Agent",
+            GIT_AUTHOR_EMAIL="agent@localhost",
+            GIT_COMMITTER_NAME="Backspace Agent",
+            GIT_COMMITTER_EMAIL="agent@localhost",
+        )
+
+    def run_code(self, code):
+        stripped = code.strip()
+        if stripped.startswith(SHELL_PREFIX) and stripped.endswith(")"):
+            command = stripped[len(SHELL_PREFIX):-1]
+            args = {"args": ["bash", "-c", command], "stderr": subprocess.STDOUT}
+        else:
+            args = {"args": [sys.executable, "-c", code], "stderr": subprocess.PIPE}
+
+        completed = subprocess.run(
+            cwd=self.workdir,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            timeout=self.timeout,
+            text=True,
+            **args
+        )
+        stdout = completed.stdout.splitlines(keepends=True)
+        stderr = (completed.stderr or "").splitlines(keepends=True)
+        error = None
+        if completed.returncode != 0 and stderr:
+            error = SimpleNamespace(name="ExecutionError", value=stderr[-1].strip(), traceback="".join(stderr))
+        return SimpleNamespace(logs=SimpleNamespace(stdout=stdout, stderr=stderr), error=error)
+
+    def kill(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def is_running(self):
+        return os.path.isdir(self.workdir)
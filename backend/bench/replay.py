@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Replays recorded job cassettes through stream_agent without calling Groq, E2B or GitHub.
+
+Record cassettes with RECORD_CASSETTES=<dir> on the server (or "record": true on a request
+and GET /jobs/{id}/cassette), or offline with `python -m bench.run --record <dir>`.
+
+Usage (from the backend directory):
+    python -m bench.replay cassettes/job-*.json --speed fast --repeat 20 --profile
+"""
+
+import argparse
+import asyncio
+import cProfile
+import importlib
+import io
+import json
+import os
+import pstats
+import sys
+import time
+
+from bench.report import latency_summary, format_table
+
+
+def load_agent():
+    # The Groq client is never called during replay, but it needs a key to be constructed
+    os.environ.setdefault("GROQ_API_KEY", "replay")
+    os.environ.setdefault("GITHUB_TOKEN", "replay")
+    return importlib.import_module("main"), importlib.import_module("cassette")
+
+
+async def replay_once(agent, cassette_module, path, speed):
+    recording = cassette_module.Cassette.load(path, speed=speed)
+    metadata = recording.metadata
+    started = time.perf_counter()
+    timings = {}
+    ok = False
+    async for event in agent.stream_agent(metadata["repoUrl"], metadata["prompt"], recording=recording):
+        data = event[len("data: "):].strip()
+        if data.startswith("{"):
+            parsed = json.loads(data)
+            ok = ok or "pr_url" in parsed
+            timings = parsed.get("timings", {}).get("stages", timings)
+    return {"path": path, "ok": ok, "latency": time.perf_counter() - started, "timings": timings}
+
+
+async def replay_all(agent, cassette_module, paths, speed, repeat):
+    results = []
+    for _ in range(repeat):
+        for path in paths:
+            results.append(await replay_once(agent, cassette_module, path, speed))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded agent jobs")
+    parser.add_argument("cassettes", nargs="+", help="cassette JSON files")
+    parser.add_argument("--speed", choices=["recorded", "fast"], default="fast",
+                        help="sleep for each recorded call's duration, or serve responses immediately")
+    parser.add_argument("--repeat", type=int, default=1, help="replay every cassette this many times")
+    parser.add_argument("--profile", action="store_true", help="profile the pipeline code with cProfile")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    agent, cassette_module = load_agent()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    results = asyncio.run(replay_all(agent, cassette_module, args.cassettes, args.speed, args.repeat))
+    if profiler:
+        profiler.disable()
+
+    stages = {}
+    for result in results:
+        for stage, entry in result["timings"].items():
+            stages.setdefault(stage, []).append(entry["seconds"])
+    e2e = latency_summary([r["latency"] for r in results])
+    print(f"Replayed {len(results)} jobs ({sum(r['ok'] for r in results)} reached a PR), speed={args.speed}")
+    print(f"End-to-end: p50={e2e['p50']}s p95={e2e['p95']}s p99={e2e['p99']}s")
+    print(format_table(
+        ["stage", "count", "p50", "p95", "max"],
+        [[stage, s["count"], s["p50"], s["p95"], s["max"]]
+         for stage, s in ((stage, latency_summary(values)) for stage, values in sorted(stages.items()))]
+    ))
+
+    if profiler:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        print(out.getvalue())
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
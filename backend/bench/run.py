@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark: runs stream_agent against a fake LLM server,
+a local sandbox executor and a fake GitHub backed by local bare repositories.
+
+Usage (from the backend directory):
+    python -m bench.run --jobs 20 --concurrency 5 --llm-latency 0.5 --llm-token-rate 200
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from bench.fake_github import FakeGitHubServer
+from bench.fake_llm import FakeLLMServer
+from bench.local_sandbox import LocalSandbox
+from bench.report import latency_summary, format_table
+
+BENCH_OWNER = "bench"
+
+
+def seed_files(file_count):
+    files = {
+        "index.html": "<!DOCTYPE html>\n<html>\n<body>\n<h1>Benchmark</h1>\n</body>\n</html>\n",
+        "README.md": "# Benchmark repository\n",
+    }
+    for i in range(max(0, file_count - len(files))):
+        files[f"src/module_{i}.py"] = f"def handler_{i}(value):\n    return value + {i}\n"
+    return files
+
+
+def start_environment(args, root):
+    """Starts the fake services and points the agent's configuration at them."""
+    llm = FakeLLMServer(latency=args.llm_latency, tokens_per_second=args.llm_token_rate).start()
+    github = FakeGitHubServer(os.path.join(root, "remotes")).start()
+    for i in range(args.repos):
+        github.create_repo(BENCH_OWNER, f"repo-{i}", seed_files(args.files))
+
+    os.environ.update({
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": llm.url,
+        "GITHUB_TOKEN": "bench",
+        "GITHUB_API_URL": github.url,
+        "GITHUB_CLONE_URL": github.clone_url,
+    })
+    sandboxes = os.path.join(root, "sandboxes")
+    os.makedirs(sandboxes, exist_ok=True)
+    return llm, github, sandboxes
+
+
+def load_agent(sandboxes):
+    # Imported late so the agent modules read the environment set up above
+    agent = importlib.import_module("main")
+    sandbox = importlib.import_module("sandbox")
+    sandbox.set_factory(lambda: LocalSandbox(root=sandboxes))
+    return agent
+
+
+def parse_event(event):
+    data = event[len("data: "):].strip() if event.startswith("data: ") else event.strip()
+    try:
+        parsed = json.loads(data)
+        return parsed if isinstance(parsed, dict) else {"message": data}
+    except ValueError:
+        return {"message": data}
+
+
+async def run_job(agent, repo_url, prompt, record_dir=None, index=0):
+    started = time.perf_counter()
+    result = {"repo": repo_url, "ok": False, "timings": {}, "tokens": 0, "error": None}
+    recording = None
+    if record_dir:
+        cassette = importlib.import_module("cassette")
+        recording = cassette.Cassette(metadata={"repoUrl": repo_url, "prompt": prompt})
+    try:
+        async for event in agent.stream_agent(repo_url, prompt, recording=recording):
+            parsed = parse_event(event)
+            if "pr_url" in parsed:
+                result["ok"] = True
+            if "timings" in parsed:
+                result["timings"] = parsed["timings"].get("stages", {})
+            if "usage" in parsed:
+                result["tokens"] = parsed["usage"]["total_tokens"]
+            if str(parsed.get("message", "")).startswith("❌") and not result["error"]:
+                result["error"] = parsed["message"]
+    except Exception as e:
+        result["error"] = str(e)
+    result["latency"] = time.perf_counter() - started
+    if recording:
+        recording.save(os.path.join(record_dir, f"job-{index}.json"))
+    return result
+
+
+async def run_benchmark(agent, jobs, concurrency, repos, record_dir=None):
+    gate = asyncio.Semaphore(concurrency)
+
+    async def limited(index):
+        async with gate:
+            repo_url = f"https://github.com/{BENCH_OWNER}/repo-{index % repos}"
+            return await run_job(agent, repo_url, f"Benchmark change #{index}", record_dir, index)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(limited(i) for i in range(jobs)))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, wall_seconds, args):
+    completed = [r for r in results if r["ok"]]
+    stage_samples = {}
+    for r in completed:
+        for stage, entry in r["timings"].items():
+            stage_samples.setdefault(stage, []).append(entry["seconds"])
+
+    return {
+        "config": {
+            "jobs": args.jobs,
+            "concurrency": args.concurrency,
+            "repos": args.repos,
+            "files": args.files,
+            "llm_latency": args.llm_latency,
+            "llm_token_rate": args.llm_token_rate,
+        },
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "errors": sorted({r["error"] for r in results if r["error"]})[:10],
+        "wall_seconds": round(wall_seconds, 3),
+        "jobs_per_minute": round(len(completed) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "end_to_end": latency_summary([r["latency"] for r in completed]),
+        "tokens_per_job": round(sum(r["tokens"] for r in completed) / len(completed)) if completed else 0,
+        "stages": {stage: latency_summary(values) for stage, values in sorted(stage_samples.items())},
+    }
+
+
+def render(summary):
+    e2e = summary["end_to_end"]
+    lines = [
+        f"Jobs: {summary['completed']} completed, {summary['failed']} failed "
+        f"in {summary['wall_seconds']}s ({summary['jobs_per_minute']} jobs/min)",
+        f"End-to-end: p50={e2e['p50']}s p95={e2e['p95']}s p99={e2e['p99']}s",
+        f"LLM tokens per job: {summary['tokens_per_job']}",
+        "",
+        format_table(
+            ["stage", "count", "p50", "p95", "p99", "max"],
+            [[stage, s["count"], s["p50"], s["p95"], s["p99"], s["max"]] for stage, s in summary["stages"].items()]
+        ),
+    ]
+    for error in summary["errors"]:
+        lines.append(f"❌ {error}")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark for the coding agent")
+    parser.add_argument("--jobs", type=int, default=10, help="number of jobs to run")
+    parser.add_argument("--concurrency", type=int, default=4, help="jobs running at the same time")
+    parser.add_argument("--repos", type=int, default=1, help="number of fake repositories to spread jobs over")
+    parser.add_argument("--files", type=int, default=50, help="files per fake repository")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds before the fake LLM answers")
+    parser.add_argument("--llm-token-rate", type=float, default=200.0, help="fake LLM completion tokens per second")
+    parser.add_argument("--json", dest="json_path", help="also write the JSON report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--record", dest="record_dir", help="save a replayable cassette per job in this directory")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = tempfile.mkdtemp(prefix="agent-bench-")
+    llm, github, sandboxes = start_environment(args, root)
+    if args.record_dir:
+        os.makedirs(args.record_dir, exist_ok=True)
+    try:
+        agent = load_agent(sandboxes)
+        results, wall_seconds = asyncio.run(
+            run_benchmark(agent, args.jobs, args.concurrency, args.repos, args.record_dir)
+        )
+        summary = summarize(results, wall_seconds, args)
+    finally:
+        llm.stop()
+        github.stop()
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print(render(summary))
+    print(json.dumps(summary, indent=2))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
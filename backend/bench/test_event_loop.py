@@ -0,0 +1,104 @@
+"""
+Regression test: stream_agent must never block the event loop.
+
+Runs full jobs against the offline fakes with a sandbox whose every command and health check
+blocks its thread for a while, and measures how late a ticker task on the same loop wakes up.
+If any sandbox or GitHub call runs on the loop instead of an executor, the ticker is held up
+for at least SANDBOX_DELAY and the test fails. Jobs run both on fresh sandboxes and on
+sandboxes reused from a SandboxPool, as batch children do.
+
+Usage (from the backend directory):
+    python -m pytest -q bench/test_event_loop.py
+    python -m bench.test_event_loop
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from bench.local_sandbox import LocalSandbox
+from bench.run import start_environment, load_agent, parse_event, BENCH_OWNER
+
+MAX_LOOP_BLOCK_MS = float(os.getenv("MAX_LOOP_BLOCK_MS", "100"))
+SANDBOX_DELAY = 0.3
+TICK = 0.01
+
+
+class SlowSandbox(LocalSandbox):
+    """LocalSandbox that holds the calling thread for SANDBOX_DELAY on every command."""
+
+    def run_code(self, code):
+        time.sleep(SANDBOX_DELAY)
+        return super().run_code(code)
+
+    def is_running(self):
+        time.sleep(SANDBOX_DELAY)
+        return super().is_running()
+
+
+async def measure_loop_lag(events):
+    """Drains `events` while a ticker records the worst wake-up delay of the loop, in ms."""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            expected = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            worst = max(worst, (time.perf_counter() - expected) * 1000)
+
+    task = asyncio.create_task(ticker())
+    collected = [parse_event(event) async for event in events]
+    done = True
+    await task
+    return worst, collected
+
+
+async def pooled_jobs(agent, sandbox):
+    """Two jobs in a row on a pool of one, so the second takes the first one's sandbox."""
+    pool = sandbox.SandboxPool(size=1)
+    events = []
+    for i in range(2):
+        async for event in agent.stream_agent(
+            f"https://github.com/{BENCH_OWNER}/repo-0", f"Pooled loop lag change #{i}", sandbox_pool=pool
+        ):
+            events.append(event)
+    assert pool.stats()["reused"] == 1, pool.stats()
+    pool.close()
+    for event in events:
+        yield event
+
+
+def test_stream_agent_does_not_block_event_loop():
+    root = tempfile.mkdtemp(prefix="agent-loop-test-")
+    args = SimpleNamespace(llm_latency=0.05, llm_token_rate=5000.0, repos=1, files=5)
+    llm, github, sandboxes = start_environment(args, root)
+    try:
+        agent = load_agent(sandboxes)
+        import sandbox
+        sandbox.set_factory(lambda: SlowSandbox(root=sandboxes))
+
+        worst, events = asyncio.run(measure_loop_lag(
+            agent.stream_agent(f"https://github.com/{BENCH_OWNER}/repo-0", "Loop lag regression change")
+        ))
+        assert any("pr_url" in e for e in events), [e.get("message") for e in events]
+        assert worst < MAX_LOOP_BLOCK_MS, f"event loop blocked for {worst:.0f}ms (limit {MAX_LOOP_BLOCK_MS:.0f}ms)"
+
+        worst, events = asyncio.run(measure_loop_lag(pooled_jobs(agent, sandbox)))
+        assert sum("pr_url" in e for e in events) == 2, [e.get("message") for e in events]
+        assert worst < MAX_LOOP_BLOCK_MS, f"pooled jobs blocked the event loop for {worst:.0f}ms (limit {MAX_LOOP_BLOCK_MS:.0f}ms)"
+    finally:
+        llm.stop()
+        github.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_stream_agent_does_not_block_event_loop()
+    print("✅ Event loop stayed responsive")
+    sys.exit(0)
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import logs
+import metrics
+
+BLOB_CACHE_MEMORY_MB = float(os.getenv("BLOB_CACHE_MEMORY_MB", "64"))
+BLOB_CACHE_DISK_MB = float(os.getenv("BLOB_CACHE_DISK_MB", "512"))
+# Shared by every worker process on the host; set to an empty string to keep the cache in memory only
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "backspace-agent-blobs"))
+
+BLOB_LOOKUPS = metrics.REGISTRY.counter(
+    "agent_blob_cache_lookups_total",
+    "File content lookups by git blob SHA, by where they were served from.",
+    ("result",)
+)
+
+
+def blob_sha(content):
+    """The git blob SHA of `content`, i.e. what `git hash-object` prints for it."""
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class BlobCache:
+    """
+    File contents keyed by git blob SHA. Contents are immutable per SHA, so entries never go
+    stale and can be shared freely: a memory LRU sits in front of a disk store that other worker
+    processes read and write too (files are written atomically). Both tiers have byte budgets
+    enforced with LRU eviction; disk recency is tracked through file mtimes.
+    """
+
+    def __init__(self, memory_bytes=BLOB_CACHE_MEMORY_MB * 1024 * 1024,
+                 disk_dir=BLOB_CACHE_DIR, disk_bytes=BLOB_CACHE_DISK_MB * 1024 * 1024):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.disk_used = self._disk_usage()
+        self.stats_counts = {"memory": 0, "disk": 0, "miss": 0}
+        self._lock = threading.Lock()
+
+    def _path(self, sha):
+        return os.path.join(self.disk_dir, sha[:2], sha[2:])
+
+    def _disk_files(self):
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return []
+        files = []
+        for prefix in os.listdir(self.disk_dir):
+            directory = os.path.join(self.disk_dir, prefix)
+            if os.path.isdir(directory):
+                files.extend(os.path.join(directory, name) for name in os.listdir(directory) if not name.startswith("."))
+        return files
+
+    def _disk_usage(self):
+        total = 0
+        for path in self._disk_files():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def get(self, sha):
+        """Returns the cached content for a blob SHA, or None."""
+        with self._lock:
+            content = self.memory.get(sha)
+            if content is not None:
+                self.memory.move_to_end(sha)
+                return self._hit("memory", content)
+
+        if self.disk_dir:
+            path = self._path(sha)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                content = data.decode("utf-8")
+                self._remember(sha, content)
+                with self._lock:
+                    return self._hit("disk", content)
+
+        with self._lock:
+            self.stats_counts["miss"] += 1
+        BLOB_LOOKUPS.inc(result="miss")
+        return None
+
+    def _hit(self, tier, content):
+        self.stats_counts[tier] += 1
+        BLOB_LOOKUPS.inc(result=tier)
+        return content
+
+    def put(self, sha, content):
+        self._remember(sha, content)
+        if not self.disk_dir:
+            return
+        path = self._path(sha)
+        if os.path.exists(path):
+            return
+        data = content.encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logs.warning("blob_write_failed", f"⚠️ Could not write blob {sha[:12]} to the disk cache: {e}")
+            return
+        with self._lock:
+            self.disk_used += len(data)
+            over_budget = self.disk_used > self.disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _remember(self, sha, content):
+        size = len(content.encode("utf-8"))
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            if sha in self.memory:
+                self.memory.move_to_end(sha)
+                return
+            self.memory[sha] = content
+            self.memory_used += size
+            while self.memory_used > self.memory_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= len(evicted.encode("utf-8"))
+
+    def _evict_disk(self):
+        """Deletes the least recently used files until the store is back under 90% of its budget."""
+        entries = []
+        for path in self._disk_files():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                pass
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        target = self.disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self.disk_used = total
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self.stats_counts.values())
+            hits = self.stats_counts["memory"] + self.stats_counts["disk"]
+            return {
+                **self.stats_counts,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_used,
+                "disk_bytes": self.disk_used,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """Returns the process-wide cache, created on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = BlobCache()
+        return _shared
+
@@ -1,29 +1,37 @@
-import requests
+import re
+import threading
+
+import cassette
+import logs
+from github_client import get_client, GitHubAPIError
+
+BRANCH_PREFIX = "backspace-agent"
+MAX_ALLOCATION_ATTEMPTS = 10
+
+# Next branch number to try per repository, so most allocations need no listing
+_next_branch_number = {}
+_allocation_lock = threading.Lock()
 
 
 def list_branches(token, username, repo_name):
     """
     Lists branches in a GitHub repository using GitHub REST API v3 and suggests a new branch name.
+    All pages are read, and unchanged pages are served from the client's ETag cache.
     """
-    url = f"https://api.github.com/repos/{username}/{repo_name}/branches"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-
-    response = requests.get(url, headers=headers)
-
     suggested_branch_name = None
 
-    if response.status_code == 200:
-        branches = response.json()
+    try:
+        branches = get_client(token).get_paginated(f"/repos/{username}/{repo_name}/branches")
+    except GitHubAPIError as e:
+        logs.error("list_branches_failed", f"❌ Failed to list branches. Status Code: {e.status_code}", error=str(e))
+        branches = None
+
+    if branches is not None:
         branch_names = [branch["name"] for branch in branches]
-        print(f"\n✅ Branches in {username}/{repo_name}:")
-        for branch_name in branch_names:
-            print(f"- {branch_name}")
+        logs.debug("branches", f"✅ {len(branch_names)} branches in {username}/{repo_name}", payload="\n".join(branch_names), sampled=True)
 
         # Check for existing 'backspace-agent' branches and suggest a new name
-        agent_branches = [name for name in branch_names if name.startswith("backspace-agent")]
+        agent_branches = [name for name in branch_names if name.startswith(BRANCH_PREFIX)]
         if agent_branches:
             # Find the highest number used in the suffix
             max_num = 0
@@ -31,14 +39,98 @@ def list_branches(token, username, repo_name):
                 parts = branch.split('-')
                 if len(parts) > 2 and parts[2].isdigit():
                     max_num = max(max_num, int(parts[2]))
-            suggested_branch_name = f"backspace-agent-{max_num + 1}"
-            print(f"\nSuggested new branch name: {suggested_branch_name}")
+            suggested_branch_name = f"{BRANCH_PREFIX}-{max_num + 1}"
         else:
-            suggested_branch_name = "backspace-agent-1"
-            print("\nSuggested new branch name: backspace-agent-1")
-
-    else:
-        print(f"\n❌ Failed to list branches. Status Code: {response.status_code}")
-        print("Response:", response.json())
+            suggested_branch_name = f"{BRANCH_PREFIX}-1"
+        logs.debug("branch_suggested", f"Suggested new branch name: {suggested_branch_name}", branch=suggested_branch_name)
 
     return suggested_branch_name
+
+
+def get_base_commit(token, username, repo_name, ref="HEAD"):
+    """
+    Returns the SHA of the head commit of `ref` (by default the repository's default branch), or None if it can't be resolved.
+    """
+    response = get_client(token).request(
+        "GET",
+        f"/repos/{username}/{repo_name}/commits/{ref}",
+        headers={"Accept": "application/vnd.github.sha"}
+    )
+
+    if response.status_code == 200:
+        return response.text.strip()
+
+    logs.error("base_commit_failed", f"❌ Failed to resolve base commit. Status Code: {response.status_code}", ref=ref)
+    return None
+
+
+def _reserve_number(token, username, repo_name, refresh=False):
+    repo_key = f"{username}/{repo_name}".lower()
+    # Recorded jobs must contain the branch listing, so cassettes skip the counter like the ETag cache does
+    recording = cassette.current() is not None
+    with _allocation_lock:
+        number = None if refresh or recording else _next_branch_number.get(repo_key)
+    if number is None:
+        suggested = list_branches(token, username, repo_name)
+        number = int(suggested.rsplit("-", 1)[1]) if suggested else 1
+    if recording:
+        return number
+    with _allocation_lock:
+        # Another job may have advanced the counter while we were listing
+        number = max(number, _next_branch_number.get(repo_key, 0))
+        _next_branch_number[repo_key] = number + 1
+    return number
+
+
+def allocate_branch(token, username, repo_name, base_sha):
+    """
+    Reserves a new backspace-agent-N branch by creating its ref at base_sha.
+    Ref creation is atomic on GitHub, so concurrent jobs can never end up with the same name;
+    on a conflict the next number is tried.
+    """
+    client = get_client(token)
+    refresh = False
+
+    for attempt in range(MAX_ALLOCATION_ATTEMPTS):
+        number = _reserve_number(token, username, repo_name, refresh=refresh)
+        branch_name = f"{BRANCH_PREFIX}-{number}"
+        response = client.post(
+            f"/repos/{username}/{repo_name}/git/refs",
+            json={"ref": f"refs/heads/{branch_name}", "sha": base_sha}
+        )
+
+        if response.status_code == 201:
+            logs.info("branch_reserved", f"✅ Reserved branch: {branch_name}", branch=branch_name)
+            return branch_name
+
+        if response.status_code != 422:
+            raise GitHubAPIError(response.status_code, response.text)
+
+        # The name is taken by a job in another process; re-list after repeated conflicts
+        logs.warning("branch_conflict", f"⚠️ Branch {branch_name} already exists, trying the next one", branch=branch_name)
+        refresh = attempt >= 2
+
+    raise GitHubAPIError(422, f"Could not reserve a branch after {MAX_ALLOCATION_ATTEMPTS} attempts")
+
+
+def is_agent_branch(branch_name):
+    """True for branch names this agent allocates, i.e. backspace-agent-N."""
+    return bool(re.fullmatch(rf"{BRANCH_PREFIX}-\d+", branch_name or ""))
+
+
+def find_pull_request(token, username, repo_name, branch_name):
+    """Returns the open pull request whose head is `branch_name`, or None."""
+    pulls = get_client(token).get(
+        f"/repos/{username}/{repo_name}/pulls",
+        params={"head": f"{username}:{branch_name}", "state": "open"}
+    )
+    return pulls[0] if pulls else None
+
+
+def release_branch(token, username, repo_name, branch_name):
+    """
+    Deletes a reserved branch that never received any commits.
+    """
+    response = get_client(token).delete(f"/repos/{username}/{repo_name}/git/refs/heads/{branch_name}")
+    if response.status_code != 204:
+        logs.warning("branch_release_failed", f"⚠️ Failed to release branch {branch_name}. Status Code: {response.status_code}", branch=branch_name)
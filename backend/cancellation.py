@@ -0,0 +1,99 @@
+import contextvars
+import os
+import threading
+
+import logs
+
+# What to do with a job's partial work when it is cancelled: "discard" deletes the reserved
+# branch, "keep" commits and pushes whatever was changed so far (without opening a PR)
+CANCEL_POLICY = os.getenv("CANCEL_POLICY", "discard")
+# How long a job may run without any connected client before it is cancelled
+CANCEL_GRACE_SECONDS = float(os.getenv("CANCEL_GRACE_SECONDS", "2"))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class CancelScope:
+    """
+    Cooperative cancellation for one job, shared by the event loop and worker threads.
+    Pipeline steps call check() between units of work; resources that can abort in-flight
+    work (HTTP clients, sandboxes) register callbacks that run when the scope is cancelled.
+    """
+
+    def __init__(self):
+        self.reason = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._llm_clients = {}
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled(self.reason)
+
+    def on_cancel(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self, reason="cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logs.warning("cancel_callback_failed", f"⚠️ Cancellation callback failed: {e}")
+        self.close()
+
+    def bind_llm_client(self, client):
+        """
+        Returns a copy of `client` with its own connection pool. Closing that pool on cancel
+        aborts any request the job has in flight; close() releases it when the job ends.
+        """
+        if not hasattr(client, "copy"):
+            return client
+        with self._lock:
+            entry = self._llm_clients.get(id(client))
+            if entry is None:
+                import httpx
+                http_client = httpx.Client(timeout=client.timeout)
+                entry = self._llm_clients[id(client)] = (client.copy(http_client=http_client), http_client)
+        return entry[0]
+
+    def close(self):
+        """Closes the job's LLM connection pools; called when the job ends, and on cancel."""
+        with self._lock:
+            entries, self._llm_clients = list(self._llm_clients.values()), {}
+        for _, http_client in entries:
+            http_client.close()
+
+
+_current = contextvars.ContextVar("cancel_scope", default=None)
+
+
+def activate(scope):
+    _current.set(scope)
+
+
+def current():
+    return _current.get()
+
+
+def check():
+    """Raises JobCancelled if the current job has been cancelled."""
+    scope = _current.get()
+    if scope is not None:
+        scope.check()
@@ -0,0 +1,188 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+# Directory where every job's interactions are recorded, if set
+RECORD_DIR = os.getenv("RECORD_CASSETTES")
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMismatch(Exception):
+    pass
+
+
+class Cassette:
+    """
+    Ordered record of a job's LLM, sandbox and GitHub interactions with their timings.
+    In replay mode the recorded responses are served back instead of calling the real services,
+    either at recorded speed or as fast as possible.
+    """
+
+    def __init__(self, mode=RECORD, interactions=None, metadata=None, speed="recorded"):
+        self.mode = mode
+        self.speed = speed
+        self.metadata = dict(metadata or {})
+        self.interactions = list(interactions or [])
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._unused = {}
+        if mode == REPLAY:
+            for interaction in self.interactions:
+                self._unused.setdefault(interaction["kind"], []).append(interaction)
+
+    @classmethod
+    def load(cls, path, speed="recorded"):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(REPLAY, data["interactions"], data.get("metadata"), speed=speed)
+
+    def save(self, path):
+        with self._lock:
+            data = {"metadata": self.metadata, "interactions": list(self.interactions)}
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+
+    def record(self, kind, key, request, response, started, duration):
+        with self._lock:
+            self.interactions.append({
+                "kind": kind,
+                "key": key,
+                "offset": round(started - self.started, 6),
+                "duration": round(duration, 6),
+                "request": request,
+                "response": response,
+            })
+
+    def next(self, kind, key):
+        """
+        Returns the next recorded interaction for (kind, key). Falls back to the next unused
+        interaction of the same kind, since keys can legitimately differ between runs (e.g. branch names).
+        """
+        with self._lock:
+            unused = self._unused.get(kind, [])
+            if not unused:
+                raise CassetteMismatch(f"No recorded {kind} interaction left for {key}")
+            index = next((i for i, interaction in enumerate(unused) if interaction["key"] == key), 0)
+            interaction = unused.pop(index)
+        if self.speed == "recorded":
+            time.sleep(interaction["duration"])
+        return interaction["response"]
+
+
+_current = contextvars.ContextVar("cassette", default=None)
+
+
+def activate(cassette):
+    _current.set(cassette)
+
+
+def current():
+    return _current.get()
+
+
+def replaying():
+    cassette = _current.get()
+    return cassette is not None and cassette.mode == REPLAY
+
+
+def intercept(kind, key, request, call, serialize, deserialize):
+    """
+    Routes one interaction through the active cassette: records `call()` when recording,
+    serves the recorded response when replaying, and just calls through otherwise.
+    """
+    cassette = _current.get()
+    if cassette is None:
+        return call()
+    if cassette.mode == REPLAY:
+        return deserialize(cassette.next(kind, key))
+
+    started = time.perf_counter()
+    result = call()
+    cassette.record(kind, key, request, serialize(result), started, time.perf_counter() - started)
+    return result
+
+
+# --- serializers for the three kinds of interactions ---
+
+def serialize_llm(response):
+    usage = getattr(response, "usage", None)
+    return {
+        "content": response.choices[0].message.content,
+        "usage": {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+        } if usage is not None else None,
+    }
+
+
+def deserialize_llm(data):
+    usage = data.get("usage")
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=data["content"]))],
+        usage=SimpleNamespace(
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage["completion_tokens"],
+            total_tokens=usage["prompt_tokens"] + usage["completion_tokens"],
+        ) if usage else None,
+    )
+
+
+def serialize_execution(execution):
+    error = getattr(execution, "error", None)
+    return {
+        "stdout": list(execution.logs.stdout),
+        "stderr": list(execution.logs.stderr),
+        "error": {"name": error.name, "value": error.value, "traceback": error.traceback} if error else None,
+    }
+
+
+def deserialize_execution(data):
+    error = data.get("error")
+    return SimpleNamespace(
+        logs=SimpleNamespace(stdout=list(data["stdout"]), stderr=list(data["stderr"])),
+        error=SimpleNamespace(**error) if error else None,
+    )
+
+
+class ReplayResponse:
+    """Enough of requests.Response for the GitHub client and its callers."""
+
+    def __init__(self, data):
+        self.status_code = data["status"]
+        self.text = data["text"]
+        self.headers = data.get("headers", {})
+        self.links = data.get("links", {})
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def serialize_http(response):
+    return {
+        "status": response.status_code,
+        "text": response.text,
+        "headers": {name: response.headers[name] for name in ("ETag", "Link", "Content-Type") if name in response.headers},
+        "links": response.links,
+    }
+
+
+def deserialize_http(data):
+    return ReplayResponse(data)
+
+
+class ReplaySandbox:
+    """Placeholder sandbox for replays; every run_code call is served from the cassette."""
+
+    def run_code(self, code):
+        raise CassetteMismatch("ReplaySandbox can only be used through sandbox.run_code while replaying")
+
+    def kill(self):
+        pass
+
+    def is_running(self):
+        return True
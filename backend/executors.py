@@ -0,0 +1,27 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "32"))
+GITHUB_WORKERS = int(os.getenv("GITHUB_WORKERS", "16"))
+
+# Dedicated, bounded pools for blocking I/O issued from the event loop, so slow sandbox
+# commands can't starve GitHub calls (or the default executor) and vice versa
+SANDBOX_EXECUTOR = ThreadPoolExecutor(max_workers=SANDBOX_WORKERS, thread_name_prefix="sandbox")
+GITHUB_EXECUTOR = ThreadPoolExecutor(max_workers=GITHUB_WORKERS, thread_name_prefix="github")
+
+
+async def run_in(executor, func, *args, **kwargs):
+    """
+    Runs a blocking call on `executor` without blocking the event loop. Like asyncio.to_thread,
+    the caller's context (job trace, cassette, cancel scope) is carried into the worker thread.
+    """
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+async def github(func, *args, **kwargs):
+    return await run_in(GITHUB_EXECUTOR, func, *args, **kwargs)
@@ -0,0 +1,168 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import cassette
+import tracing
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+POOL_SIZE = int(os.getenv("GITHUB_POOL_SIZE", "20"))
+CACHE_SIZE = int(os.getenv("GITHUB_CACHE_SIZE", "512"))
+PER_PAGE = 100
+
+
+class GitHubAPIError(Exception):
+    def __init__(self, status_code, message, retry_after=None):
+        super().__init__(f"GitHub API error: {status_code} - {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class GitHubClient:
+    """
+    GitHub REST client with a pooled session, pagination and an ETag cache.
+    Cached GETs are revalidated with If-None-Match, and 304 responses don't count against the rate limit.
+    """
+
+    def __init__(self, token, base_url=GITHUB_API_URL, pool_size=POOL_SIZE, cache_size=CACHE_SIZE):
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github+json"
+        })
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "not_modified": 0}
+
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        self.stats["requests"] += 1
+        url = self.url(path)
+        endpoint = f"{method} {url[len(self.base_url):]}"
+        query = kwargs["json"].get("query") if isinstance(kwargs.get("json"), dict) else None
+        operation = re.search(r"\b(?:query|mutation)\s+(\w+)", query) if isinstance(query, str) else None
+        if operation:
+            # Every GraphQL call shares one URL; the operation name tells cassette entries apart
+            endpoint += f" {operation.group(1)}"
+        with tracing.span(f"github {endpoint}", cat="github") as span:
+            response = cassette.intercept(
+                "github", endpoint, {"method": method, "url": url, "params": kwargs.get("params"), "json": kwargs.get("json")},
+                lambda: self.session.request(method, url, **kwargs),
+                cassette.serialize_http, cassette.deserialize_http
+            )
+            span["status"] = response.status_code
+            return response
+
+    def graphql_url(self):
+        # GitHub Enterprise serves REST under /api/v3 and GraphQL under /api/graphql
+        if self.base_url.endswith("/api/v3"):
+            return self.base_url[:-len("/v3")] + "/graphql"
+        return f"{self.base_url}/graphql"
+
+    def graphql(self, query, variables=None, ignore_errors=()):
+        """
+        Runs a GraphQL query or mutation and returns its `data`. Errors raise GitHubAPIError, except
+        when every error's type is in `ignore_errors` (e.g. NOT_FOUND for optional lookups).
+        """
+        response = self.request("POST", self.graphql_url(), json={"query": query, "variables": variables or {}})
+        retry_after = response.headers.get("Retry-After")
+        if response.status_code != 200:
+            raise GitHubAPIError(response.status_code, response.text, retry_after)
+        body = response.json()
+        errors = body.get("errors") or []
+        if errors and body.get("data") is not None and all(error.get("type") in ignore_errors for error in errors):
+            return body["data"]
+        if errors:
+            messages = "; ".join(
+                f"{error.get('type', 'ERROR')}: {error.get('message', '')}" for error in body["errors"]
+            )
+            raise GitHubAPIError(response.status_code, messages, retry_after)
+        return body["data"]
+
+    def post(self, path, json=None, **kwargs):
+        return self.request("POST", path, json=json, **kwargs)
+
+    def patch(self, path, json=None, **kwargs):
+        return self.request("PATCH", path, json=json, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def _get_page(self, url, params=None, headers=None):
+        """Returns (body, next_url) for one page, using the ETag cache."""
+        cache_key = requests.Request("GET", url, params=params).prepare().url
+        with self._lock:
+            cached = self._cache.get(cache_key)
+        if cassette.current() is not None:
+            # Recorded interactions must be full responses so they replay without this cache
+            cached = None
+
+        request_headers = dict(headers or {})
+        if cached:
+            request_headers["If-None-Match"] = cached[0]
+
+        response = self.request("GET", url, params=params, headers=request_headers)
+
+        if response.status_code == 304 and cached:
+            self.stats["not_modified"] += 1
+            with self._lock:
+                self._cache.move_to_end(cache_key)
+            return cached[1], cached[2]
+
+        if response.status_code != 200:
+            raise GitHubAPIError(response.status_code, response.text)
+
+        body = response.json()
+        next_url = response.links.get("next", {}).get("url")
+        etag = response.headers.get("ETag")
+        if etag:
+            with self._lock:
+                self._cache[cache_key] = (etag, body, next_url)
+                self._cache.move_to_end(cache_key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return body, next_url
+
+    def get(self, path, params=None, headers=None):
+        body, _ = self._get_page(self.url(path), params=params, headers=headers)
+        return body
+
+    def get_paginated(self, path, params=None):
+        """Follows Link: rel="next" headers and returns the concatenated list of items."""
+        params = dict(params or {})
+        params.setdefault("per_page", PER_PAGE)
+        items = []
+        body, next_url = self._get_page(self.url(path), params=params)
+        items.extend(body)
+        while next_url:
+            # The next link already carries the query string
+            body, next_url = self._get_page(next_url)
+            items.extend(body)
+        return items
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(token):
+    """Returns the shared client for a token so every caller reuses one connection pool and cache."""
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = GitHubClient(token)
+            _clients[token] = client
+        return client
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+
+import cancellation
+import logs
+import metrics
+
+# How many finished jobs to keep around for lookups after they complete
+FINISHED_JOB_RETENTION = 200
+
+
+def idempotency_key(repo_url, prompt, base_commit=None):
+    """
+    Derives a stable key for a request from the repository, the prompt and the commit it would be applied to.
+    """
+    normalized_url = repo_url.strip().rstrip("/").lower()
+    if normalized_url.endswith(".git"):
+        normalized_url = normalized_url[:-4]
+    payload = json.dumps([normalized_url, prompt.strip(), base_commit or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Job:
+    """
+    A single agent pipeline run. Events are buffered so that every subscriber,
+    including ones that attach late, sees the full stream from the beginning.
+    """
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.events = []
+        self.done = False
+        self.subscribers = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self.task = None
+        self.trace = None
+        self.cassette = None
+        self.log = logs.JobLog(self.id)
+        self.cancel_scope = cancellation.CancelScope()
+        self.watchdog = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event):
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def finish(self):
+        async with self._changed:
+            self.done = True
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    async def follow(self):
+        """Yields every event of the job, waiting for new ones until the job is done."""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.done)
+                pending = self.events[index:]
+                index = len(self.events)
+                finished = self.done and index == len(self.events)
+            for event in pending:
+                yield event
+            if finished:
+                return
+
+
+class JobRegistry:
+    """
+    Tracks in-flight jobs by idempotency key so identical requests attach to
+    the running pipeline instead of starting a new one.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.in_flight = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def find(self, key):
+        """Returns the in-flight job for an idempotency key, if any."""
+        return self.in_flight.get(key)
+
+    def submit(self, key, run):
+        """
+        Returns (job, created). `run` is called with the new job and must return
+        an async iterator of SSE events; it is only invoked when no identical job is running.
+        """
+        job = self.in_flight.get(key)
+        if job is not None:
+            self.coalesced += 1
+            metrics.JOBS_COALESCED.inc()
+            return job, False
+
+        job = Job(key)
+        self.jobs[job.id] = job
+        self.in_flight[key] = job
+        self.started += 1
+        metrics.JOBS_STARTED.inc()
+        job.task = asyncio.create_task(self._drive(job, run))
+        return job, True
+
+    async def _drive(self, job, run):
+        try:
+            async for event in run(job):
+                await job.publish(event)
+        finally:
+            if self.in_flight.get(job.key) is job:
+                del self.in_flight[job.key]
+            await job.finish()
+            self._prune()
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.done]
+        excess = len(finished) - FINISHED_JOB_RETENTION
+        if excess <= 0:
+            return
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[:excess]:
+            del self.jobs[job.id]
+
+    async def stream(self, job):
+        """Streams a job's events to one subscriber."""
+        job.subscribers += 1
+        try:
+            async for event in job.follow():
+                yield event
+        finally:
+            job.subscribers -= 1
+            if job.subscribers == 0 and not job.done:
+                # Keep a reference so the watchdog task isn't garbage collected while it sleeps
+                job.watchdog = asyncio.get_running_loop().create_task(self._cancel_if_abandoned(job))
+
+    async def _cancel_if_abandoned(self, job):
+        """Cancels a job whose last client disconnected, unless a client reattaches within the grace period."""
+        await asyncio.sleep(cancellation.CANCEL_GRACE_SECONDS)
+        if job.subscribers == 0 and not job.done and not job.cancel_scope.cancelled:
+            logs.info("job_abandoned", f"🛑 All clients of job {job.id} disconnected, cancelling it", job_id=job.id)
+            job.cancel_scope.cancel("client disconnected")
+            metrics.JOBS_CANCELLED.inc(reason="client_disconnect", policy=cancellation.CANCEL_POLICY)
+
+    def stats(self):
+        total = self.started + self.coalesced
+        return {
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.in_flight),
+            "dedup_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,39 @@
+import cancellation
+import cassette
+import tracing
+import usage
+
+MODEL_NAME = "gemma2-9b-it"
+
+
+def chat(client, messages, model=MODEL_NAME, stage="llm"):
+    """
+    Sends a chat completion request and records it, with its token usage, in the job's trace and
+    usage accounting. If the job is cancelled while the request is in flight, the request is aborted
+    and JobCancelled is raised; once the job is over its token or cost budget, BudgetExceeded is.
+    """
+    cancellation.check()
+    job_usage = usage.current()
+    if job_usage is not None:
+        job_usage.check()
+    scope = cancellation.current()
+    if scope is not None:
+        client = scope.bind_llm_client(client)
+
+    with tracing.span(f"llm:{stage}", cat="llm", model=model) as span:
+        try:
+            response = cassette.intercept(
+                "llm", stage, {"model": model, "messages": messages},
+                lambda: client.chat.completions.create(model=model, messages=messages),
+                cassette.serialize_llm, cassette.deserialize_llm
+            )
+        except Exception:
+            cancellation.check()
+            raise
+        tokens = getattr(response, "usage", None)
+        if tokens is not None:
+            span["prompt_tokens"] = tokens.prompt_tokens
+            span["completion_tokens"] = tokens.completion_tokens
+            if job_usage is not None:
+                job_usage.record(stage, model, tokens.prompt_tokens, tokens.completion_tokens)
+        return response
@@ -0,0 +1,184 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" keeps the console readable, "json" writes one object per line for log shippers
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# How much of a payload (script, diff, file content) goes into a log record; 0 keeps only its hash and size
+LOG_PAYLOAD_BYTES = int(os.getenv("LOG_PAYLOAD_BYTES", "0"))
+# Share of high-volume events written to the console; the job's ring buffer still keeps all of them
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+# Console records per second across all jobs; the excess is dropped and counted
+LOG_MAX_PER_SECOND = float(os.getenv("LOG_MAX_PER_SECOND", "200"))
+# Records kept per job for GET /jobs/{id}/logs
+LOG_RING_SIZE = int(os.getenv("LOG_RING_SIZE", "500"))
+
+LOG_RECORDS = metrics.REGISTRY.counter(
+    "agent_log_records_total",
+    "Log records by level, whether or not they reached the console.",
+    ("level",)
+)
+LOG_DROPPED = metrics.REGISTRY.counter(
+    "agent_log_records_dropped_total",
+    "Log records kept off the console, by reason (below_level, sampled or rate_limited).",
+    ("reason",)
+)
+
+_logger = logging.getLogger("agent")
+_logger.propagate = False
+if not _logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+_logger.setLevel(logging.DEBUG)
+_threshold = logging.getLevelName(LOG_LEVEL)
+if not isinstance(_threshold, int):
+    _threshold = logging.INFO
+
+
+class JobLog:
+    """The last LOG_RING_SIZE records of one job, at every level, unsampled."""
+
+    def __init__(self, job_id, size=LOG_RING_SIZE):
+        self.job_id = job_id
+        self.records = deque(maxlen=size)
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+            self.total += 1
+
+    def to_dict(self, level=None, limit=None):
+        minimum = logging.getLevelName(level.upper()) if level else logging.DEBUG
+        if not isinstance(minimum, int):
+            minimum = logging.DEBUG
+        with self._lock:
+            records = [r for r in self.records if logging.getLevelName(r["level"]) >= minimum]
+            total = self.total
+        if limit:
+            records = records[-limit:]
+        return {"job_id": self.job_id, "total": total, "evicted": max(0, total - self.records.maxlen), "records": records}
+
+
+class _RateLimit:
+    """Token bucket refilled at `rate` per second, holding at most one second's worth."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+_rate_limit = _RateLimit(LOG_MAX_PER_SECOND)
+_current_log = contextvars.ContextVar("job_log", default=None)
+_context = contextvars.ContextVar("log_context", default={})
+
+
+def activate(job_log, **context):
+    """Sends this context's records to `job_log` and tags them with the job id and `context`."""
+    _current_log.set(job_log)
+    if job_log is not None:
+        context = {"job_id": job_log.job_id, **context}
+    _context.set(context)
+
+
+def enabled(level):
+    """True if records at `level` reach the console; lets callers skip work that only feeds a log line."""
+    return logging.getLevelName(level.upper()) >= _threshold
+
+
+def summarize(payload):
+    """Describes a payload by size and hash, plus its first LOG_PAYLOAD_BYTES bytes if configured."""
+    text = "".join(payload) if isinstance(payload, (list, tuple)) else str(payload)
+    data = text.encode("utf-8")
+    summary = {
+        "bytes": len(data),
+        "lines": text.count("\n") + (1 if text and not text.endswith("\n") else 0),
+        "sha256": hashlib.sha256(data).hexdigest()[:16],
+    }
+    if LOG_PAYLOAD_BYTES > 0:
+        summary["preview"] = data[:LOG_PAYLOAD_BYTES].decode("utf-8", "ignore")
+        summary["truncated"] = len(data) > LOG_PAYLOAD_BYTES
+    return summary
+
+
+def _format(record):
+    if LOG_FORMAT == "json":
+        return json.dumps(record, default=str, ensure_ascii=False)
+    prefix = f"[{record['job_id']}] " if "job_id" in record else ""
+    line = f"{prefix}{record['message']}"
+    payload = record.get("payload")
+    if payload:
+        line += f" ({payload['bytes']} bytes, {payload['lines']} lines, sha256 {payload['sha256']})"
+        if "preview" in payload:
+            line += "\n" + payload["preview"] + ("…" if payload["truncated"] else "")
+    return line
+
+
+def log(level, event, message, payload=None, sampled=False, **fields):
+    """
+    Records one event. Every record goes to the current job's ring buffer; it reaches the console
+    only if it is at or above LOG_LEVEL, survives sampling (`sampled` marks high-volume events;
+    warnings and errors are never sampled) and fits under LOG_MAX_PER_SECOND.
+    """
+    level = level.upper()
+    record = {"ts": round(time.time(), 3), "level": level, "event": event, "message": message, **_context.get(), **fields}
+    if payload is not None:
+        record["payload"] = summarize(payload)
+    job_log = _current_log.get()
+    if job_log is not None:
+        job_log.add(record)
+    LOG_RECORDS.inc(level=level)
+
+    levelno = logging.getLevelName(level)
+    if levelno < _threshold:
+        LOG_DROPPED.inc(reason="below_level")
+        return
+    if sampled and levelno < logging.WARNING and random.random() >= LOG_SAMPLE_RATE:
+        LOG_DROPPED.inc(reason="sampled")
+        return
+    if not _rate_limit.take():
+        LOG_DROPPED.inc(reason="rate_limited")
+        return
+    _logger.log(levelno, _format(record))
+
+
+def debug(event, message, **fields):
+    log("DEBUG", event, message, **fields)
+
+
+def info(event, message, **fields):
+    log("INFO", event, message, **fields)
+
+
+def warning(event, message, **fields):
+    log("WARNING", event, message, **fields)
+
+
+def error(event, message, **fields):
+    log("ERROR", event, message, **fields)
@@ -1,15 +1,37 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from dotenv import load_dotenv
+
+# Load .env before the local modules below read their configuration
+load_dotenv()
+
+from fastapi import FastAPI, Header
+from fastapi.responses import StreamingResponse, Response, JSONResponse
 from pydantic import BaseModel
-from e2b_code_interpreter import Sandbox
+from typing import Optional, List
 from groq import Groq
-import os, re, json
+import os, re, json, uuid
 import asyncio
 from ai_implementation import identify_and_modify_file
-from dotenv import load_dotenv
-from branch import list_branches
-
-load_dotenv()
+from llm import MODEL_NAME
+import sandbox
+from sandbox import run_code as sandbox_run, run_code_async as sandbox_run_async
+from branch import allocate_branch, release_branch, get_base_commit, find_pull_request, is_agent_branch
+from jobs import JobRegistry, idempotency_key
+import metrics
+import tracing
+import cassette
+import cancellation
+import executors
+import progress
+import blob_cache
+import repo_maps
+import publisher
+import verify
+import usage
+import logs
+from admission import AdmissionController, AdmissionRejected
+import batch
+from sessions import SessionRegistry, SessionError
+from workspaces import WorkspaceCache
 
 app = FastAPI()
 
@@ -17,15 +39,51 @@ app = FastAPI()
 E2B_API_KEY = os.getenv("E2B_API_KEY")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GITHUB_CLONE_URL = os.getenv("GITHUB_CLONE_URL", "https://{token}@github.com/{owner}/{repo}.git")
 
 client = Groq(api_key=GROQ_API_KEY)
 
+jobs = JobRegistry()
+admission = AdmissionController()
+sessions = SessionRegistry()
+workspaces = WorkspaceCache()
+
+REPO_URL_PATTERN = r"https://github.com/(.*?)/(.*?)(?:.git)?$"
+
 class CodeRequest(BaseModel):
     repoUrl: str
     prompt: str
+    idempotencyKey: Optional[str] = None
+    trace: bool = False
+    record: bool = False
+    # Continue an existing backspace-agent-N branch: push another commit to its PR instead of opening a new one
+    branch: Optional[str] = None
+    # Applied to the new PR; unset fields fall back to PR_LABELS, PR_REVIEWERS and PR_DRAFT
+    labels: Optional[List[str]] = None
+    reviewers: Optional[List[str]] = None
+    draft: Optional[bool] = None
+    # Run the repository's tests or linters on the edits before pushing; unset falls back to VERIFY_DEFAULT
+    verify: Optional[bool] = None
+    # Hard limits on the job's LLM use; unset falls back to JOB_TOKEN_BUDGET and JOB_COST_BUDGET
+    tokenBudget: Optional[int] = None
+    costBudget: Optional[float] = None
+
+class BatchRequest(BaseModel):
+    repoUrls: List[str]
+    prompt: str
+    parallel: Optional[int] = None
+
+class SessionRequest(BaseModel):
+    repoUrl: str
+
+class SessionPromptRequest(BaseModel):
+    prompt: str
+    idempotencyKey: Optional[str] = None
+    trace: bool = False
+    record: bool = False
 
 # --- helper: send streaming logs ---
-async def stream_agent(repoUrl, prompt):
+async def stream_agent(repoUrl, prompt, trace=None, recording=None, cancel_scope=None, sandbox_pool=None, session=None, branch=None, pr_options=None, log=None, verify_changes=None, budget=None):
     def send(msg, as_json=False):
         if as_json:
             return f"data: {json.dumps(msg)}\n\n"
@@ -34,71 +92,453 @@ async def stream_agent(repoUrl, prompt):
     yield send("🔍 Initializing agent...")
 
     # Extract repo info
-    match = re.match(r"https://github.com/(.*?)/(.*?)(?:.git)?$", repoUrl)
+    match = re.match(REPO_URL_PATTERN, repoUrl)
     if not match:
         yield send("❌ Invalid GitHub URL.")
         return
     username, repo_name = match.groups()
     repo_dir = repo_name
 
-    sbx = Sandbox(api_key=E2B_API_KEY, timeout=180)
+    logs.activate(log, repo=f"{username}/{repo_name}")
+    tracing.activate(trace)
+    cassette.activate(recording)
+    cancel_scope = cancel_scope or cancellation.CancelScope()
+    cancellation.activate(cancel_scope)
+    timings = metrics.start_job(model=MODEL_NAME)
+    job_usage = usage.JobUsage(**(budget or {}))
+    usage.activate(job_usage)
+    outcome = "error"
+
+    def timing_summary():
+        summary = timings.summary()
+        spent = job_usage.summary()
+        message = f"⏱️ Job finished in {summary['total_seconds']}s, {spent['total_tokens']} tokens (~${spent['cost_usd']:.4f})"
+        return send({"message": message, "timings": summary, "usage": spent}, as_json=True)
+
+    follow_up = branch is not None
+    reused_workspace = False
+    if session:
+        sbx = session.sbx
+    elif follow_up and (sbx := await workspaces.take(username, repo_name, branch)) is not None:
+        reused_workspace = True
+    else:
+        with metrics.stage("sandbox_create"):
+            sbx = await (sandbox_pool.acquire() if sandbox_pool else sandbox.create_async())
+    if cancellation.CANCEL_POLICY == "discard" and not session:
+        # Tearing the sandbox down also aborts whatever command is running in it. Cancel
+        # callbacks may fire on the event loop, so the kill itself goes to the sandbox executor
+        cancel_scope.on_cancel(lambda: sandbox.kill_in_background(sbx))
+    branch_name = None
+    pushed = False
     
     try:
-        # Clone repo
-        clone = f"pwd && git clone https://{GITHUB_TOKEN}@github.com/{username}/{repo_name}.git && cd {repo_name}"
-        yield send("📥 Cloning repo...")
-        result = sbx.run_code(f"!( {clone} )")
-        if result.logs.stderr:
-            yield send("❌ Error during cloning:")
-            for err in result.logs.stderr:
-                yield send(err)
-            return
-        yield send("✅ Repo cloned.")
+        if session:
+            # The session's clone is reused; each prompt starts again from the base commit
+            yield send("♻️ Reusing session clone...")
+            with metrics.stage("reset"):
+                await session.reset()
+        elif follow_up:
+            # Continue the branch: update the cached clone if it's still alive, otherwise fetch only that branch
+            if reused_workspace:
+                yield send(f"♻️ Reusing workspace of {branch}...")
+                checkout = f"cd {repo_dir} && git fetch -q origin {branch} && git checkout -q -B {branch} FETCH_HEAD && git clean -fdq"
+            else:
+                yield send(f"📥 Fetching branch {branch}...")
+                clone_url = GITHUB_CLONE_URL.format(token=GITHUB_TOKEN, owner=username, repo=repo_name)
+                checkout = f"git clone -q --single-branch --branch {branch} {clone_url}"
+            with metrics.stage("clone"):
+                result = await sandbox_run_async(sbx, f"!( {checkout} )")
+                current = await sandbox_run_async(sbx, f"!( cd {repo_dir} && git rev-parse --abbrev-ref HEAD && git rev-parse HEAD )")
+            current_branch, _, commit_sha = "".join(current.logs.stdout).strip().partition("\n")
+            if current_branch != branch:
+                yield send(f"❌ Could not check out branch {branch}:")
+                for line in result.logs.stderr or result.logs.stdout:
+                    yield send(line)
+                timings.finish(outcome)
+                yield timing_summary()
+                return
+            branch_name = branch
+            yield send(f"✅ Continuing branch: {branch_name}")
+        else:
+            # Clone repo
+            clone_url = GITHUB_CLONE_URL.format(token=GITHUB_TOKEN, owner=username, repo=repo_name)
+            clone = f"pwd && git clone {clone_url} && cd {repo_name}"
+            yield send("📥 Cloning repo...")
+            with metrics.stage("clone"):
+                result = await sandbox_run_async(sbx, f"!( {clone} )")
+            if result.logs.stderr:
+                yield send("❌ Error during cloning:")
+                for err in result.logs.stderr:
+                    yield send(err)
+                timings.finish(outcome)
+                yield timing_summary()
+                return
+            yield send("✅ Repo cloned.")
+
+        if not follow_up:
+            # Reserve a branch at the cloned commit so concurrent jobs can't pick the same name
+            cancel_scope.check()
+            yield send("🌿 Creating new branch...")
+            with metrics.stage("branch_allocate"):
+                if session:
+                    base_sha = session.base_sha
+                else:
+                    head = await sandbox_run_async(sbx, f"!( cd {repo_dir} && git rev-parse HEAD )")
+                    base_sha = "".join(head.logs.stdout).strip()
+                commit_sha = base_sha
+                branch_name = await executors.github(allocate_branch, GITHUB_TOKEN, username, repo_name, base_sha)
+                await sandbox_run_async(sbx, f"!( cd {repo_dir} && git checkout -b {branch_name} )")
+            yield send(f"✅ Switched to branch: {branch_name}")
 
-        # Checkout new branch
-        branch_name = list_branches(GITHUB_TOKEN, username, repo_name)
-        yield send("🌿 Creating new branch...")
-        sbx.run_code(f"!( cd {repo_dir} && git checkout -b {branch_name} )")
-        yield send(f"✅ Switched to branch: {branch_name}")
+        # Apply code fix via AI, forwarding its progress events as they happen
+        channel = progress.ProgressChannel()
+        progress.activate(channel)
+        work = asyncio.ensure_future(asyncio.to_thread(
+            identify_and_modify_file, prompt, sbx, client, repo_dir,
+            cache=session.cache if session else None, map_key=repo_maps.map_key(username, repo_name, commit_sha)
+        ))
+        work.add_done_callback(lambda _: channel.close())
+        async for event in channel.events():
+            yield send(event, as_json=True)
+        await work
 
-        # Apply code fix via AI
-        await asyncio.to_thread(identify_and_modify_file, prompt, sbx, client, repo_dir)
+        if verify.VERIFY_DEFAULT if verify_changes is None else verify_changes:
+            yield send("🧪 Verifying changes...")
+            channel = progress.ProgressChannel()
+            progress.activate(channel)
+            with metrics.stage("verify"):
+                checks = asyncio.ensure_future(asyncio.to_thread(verify.run, sbx, repo_dir))
+                checks.add_done_callback(lambda _: channel.close())
+                async for event in channel.events():
+                    yield send(event, as_json=True)
+                report = await checks
+            if not report["passed"] and verify.VERIFY_FAIL_POLICY == "block":
+                yield send("❌ Verification failed, nothing was pushed.")
+                if branch_name and not follow_up:
+                    await executors.github(release_branch, GITHUB_TOKEN, username, repo_name, branch_name)
+                timings.finish(outcome)
+                yield timing_summary()
+                return
 
         # Stage, commit, push
         yield send("📦 Staging changes...")
-        sbx.run_code(f"!( cd {repo_dir} && git add . )")
+        with metrics.stage("git_add"):
+            await sandbox_run_async(sbx, f"!( cd {repo_dir} && git add . )")
 
         yield send("📝 Committing changes...")
-        sbx.run_code(f'''!( cd {repo_dir} && git commit -m "{prompt[:40]}" )''')
+        with metrics.stage("commit"):
+            await sandbox_run_async(sbx, f'''!( cd {repo_dir} && git commit -m "{prompt[:40]}" )''')
 
         yield send("🚀 Pushing to GitHub...")
-        sbx.run_code(f"!( cd {repo_dir} && git push origin {branch_name} )")
-
-        # Create PR
-        yield send("📬 Creating pull request...")
-        import requests
-        pr_payload = {
-            "title": f"🔧 Code fix: {prompt[:50]}",
-            "head": branch_name,
-            "base": "main",
-            "body": f"This PR was generated by an AI agent based on your prompt: '{prompt}'."
-        }
-        res = requests.post(
-            f"https://api.github.com/repos/{username}/{repo_name}/pulls",
-            headers={"Authorization": f"Bearer {GITHUB_TOKEN}", "Accept": "application/vnd.github+json"},
-            json=pr_payload
-        )
-        if res.status_code == 201:
-            pr_url = res.json()["html_url"]
-            yield send({"message": "✅ Pull request created.", "pr_url": pr_url}, as_json=True)
+        with metrics.stage("push"):
+            await sandbox_run_async(sbx, f"!( cd {repo_dir} && git push origin {branch_name} )")
+        pushed = True
+
+        # A follow-up lands on the branch's existing PR
+        cancel_scope.check()
+        existing_pr = None
+        if follow_up:
+            with metrics.stage("pull_request"):
+                existing_pr = await executors.github(find_pull_request, GITHUB_TOKEN, username, repo_name, branch_name)
+        if existing_pr:
+            outcome = "success"
+            yield send({"message": "✅ Follow-up commit pushed to the pull request.", "pr_url": existing_pr["html_url"]}, as_json=True)
         else:
-            yield send(f"❌ Failed to create pull request: {res.text}")
+            # Create PR against the repository's default branch, with labels, reviewers and draft status
+            yield send("📬 Creating pull request...")
+            with metrics.stage("pull_request"):
+                try:
+                    pr = await publisher.shared().publish(
+                        GITHUB_TOKEN, username, repo_name, branch_name,
+                        title=f"🔧 Code fix: {prompt[:50]}",
+                        body=f"This PR was generated by an AI agent based on your prompt: '{prompt}'.",
+                        **(pr_options or {})
+                    )
+                except publisher.PublishError as e:
+                    pr = None
+                    yield send(f"❌ {e}")
+            if pr:
+                outcome = "success"
+                for warning in pr["warnings"]:
+                    yield send(f"⚠️ {warning}")
+                yield send({"message": "✅ Pull request created.", "pr_url": pr["url"], "pull_request": pr}, as_json=True)
 
     except Exception as e:
-        yield send(f"❌ Unexpected error: {str(e)}")
+        if cancel_scope.cancelled:
+            outcome = "cancelled"
+            yield send(f"🛑 Job cancelled ({cancel_scope.reason}), partial work policy: {cancellation.CANCEL_POLICY}")
+            await executors.run_in(executors.SANDBOX_EXECUTOR, handle_cancelled_work,
+                sbx, username, repo_name, repo_dir, branch_name, prompt, kill=not session, release=not follow_up
+            )
+        else:
+            if isinstance(e, usage.BudgetExceeded):
+                outcome = "over_budget"
+                yield send(f"💸 Job stopped: {e}")
+            else:
+                yield send(f"❌ Unexpected error: {str(e)}")
+            if branch_name and not pushed and not follow_up:
+                await executors.github(release_branch, GITHUB_TOKEN, username, repo_name, branch_name)
+    finally:
+        timings.finish(outcome)
+        cancel_scope.close()
+        if sandbox_pool:
+            await sandbox_pool.release(sbx, repo_dir, reusable=not cancel_scope.cancelled)
+        elif outcome == "success" and not session:
+            # Keep the clone around for follow-up edits on this branch
+            await workspaces.put(username, repo_name, branch_name, sbx)
+    yield timing_summary()
     # finally:
     #     sbx.stop()
 
+def handle_cancelled_work(sbx, username, repo_name, repo_dir, branch_name, prompt, kill=True, release=True):
+    """
+    Applies CANCEL_POLICY to a cancelled job: "keep" pushes whatever was changed so far
+    to the reserved branch without opening a PR, "discard" deletes the branch.
+    The sandbox is killed unless it belongs to a session, and branches the job didn't
+    create itself (follow-ups) are never deleted.
+    """
+    if branch_name and cancellation.CANCEL_POLICY == "keep":
+        sandbox_run(sbx, f"!( cd {repo_dir} && git add . )", cancellable=False)
+        sandbox_run(sbx, f'''!( cd {repo_dir} && git commit -m "WIP (cancelled): {prompt[:30]}" )''', cancellable=False)
+        sandbox_run(sbx, f"!( cd {repo_dir} && git push origin {branch_name} )", cancellable=False)
+        logs.info("partial_work_kept", f"💾 Kept partial work of cancelled job on {branch_name}", branch=branch_name)
+    elif branch_name and release:
+        release_branch(GITHUB_TOKEN, username, repo_name, branch_name)
+    if kill:
+        sandbox.kill(sbx)
+
+async def request_key(req, header_key):
+    """
+    Uses the client-supplied idempotency key if there is one, otherwise derives it from repoUrl, prompt and base commit.
+    """
+    explicit = req.idempotencyKey or header_key
+    if explicit:
+        # Scoped to the repository and branch, so clients reusing a key elsewhere don't join each other's jobs
+        match = re.match(REPO_URL_PATTERN, req.repoUrl)
+        repo = "/".join(match.groups()).lower() if match else req.repoUrl.strip().lower()
+        if req.branch:
+            repo += f"#{req.branch}"
+        return f"explicit:{repo}:{explicit}"
+
+    base_commit = None
+    match = re.match(REPO_URL_PATTERN, req.repoUrl)
+    if match:
+        username, repo_name = match.groups()
+        try:
+            base_commit = await executors.github(
+                get_base_commit, GITHUB_TOKEN, username, repo_name, req.branch or "HEAD"
+            )
+        except Exception as e:
+            logs.warning("idempotency_base_commit", f"⚠️ Could not resolve base commit for idempotency key: {e}")
+    repo_url = f"{req.repoUrl}#{req.branch}" if req.branch else req.repoUrl
+    return idempotency_key(repo_url, req.prompt, base_commit)
+
+async def record_job(job, events):
+    """Saves the job's cassette once the pipeline is done."""
+    try:
+        async for event in events:
+            yield event
+    finally:
+        if cassette.RECORD_DIR:
+            os.makedirs(cassette.RECORD_DIR, exist_ok=True)
+            job.cassette.save(os.path.join(cassette.RECORD_DIR, f"job-{job.id}.json"))
+
+async def admitted(job, ticket, events):
+    """
+    Holds the job in the admission queue, reporting its position over SSE, then runs it.
+    Without a ticket (session prompts, which first wait for their session) one is taken here.
+    """
+    if ticket is None:
+        ticket = await admission.enter_when_possible(cancelled=lambda: job.cancel_scope.cancelled)
+        if ticket is None:
+            yield "data: 🛑 Job cancelled while queued\n\n"
+            return
+    try:
+        async for position in admission.wait(ticket, cancelled=lambda: job.cancel_scope.cancelled):
+            yield f"data: {json.dumps({'message': f'⏳ Waiting for a free slot, position {position} in queue', 'queue_position': position})}\n\n"
+        if not ticket.granted:
+            yield "data: 🛑 Job cancelled while queued\n\n"
+            return
+        async for event in events():
+            yield event
+    finally:
+        await admission.release(ticket)
+
+async def subscribe(job, created):
+    if not created:
+        yield f"data: 🔗 Identical request already running, attached to job {job.id}\n\n"
+    async for event in jobs.stream(job):
+        yield event
+
+def start_job(req, key, ticket, sandbox_pool=None, session=None):
+    """Submits the agent pipeline for `req` to the job registry; returns (job, created)."""
+    def pipeline(job):
+        if req.trace or tracing.TRACE_ALL_JOBS:
+            job.trace = tracing.JobTrace(name=f"job {job.id}")
+        recording = None
+        if req.record or cassette.RECORD_DIR:
+            job.cassette = recording = cassette.Cassette(metadata={"job_id": job.id, "repoUrl": req.repoUrl, "prompt": req.prompt})
+        events = stream_agent(
+            req.repoUrl, req.prompt, trace=job.trace, recording=recording,
+            cancel_scope=job.cancel_scope, sandbox_pool=sandbox_pool, session=session, branch=req.branch, log=job.log, verify_changes=req.verify,
+            budget={"token_budget": req.tokenBudget, "cost_budget": req.costBudget},
+            pr_options={
+                name: getattr(req, name) for name in ("labels", "reviewers", "draft") if getattr(req, name, None) is not None
+            }
+        )
+        return record_job(job, events) if recording else events
+
+    if session:
+        # The session's lock comes before the admission slot, so prompts queued behind another
+        # prompt of the same session don't hold slots while they wait
+        return jobs.submit(key, lambda job: session.run(admitted(job, None, lambda: pipeline(job))))
+    return jobs.submit(key, lambda job: admitted(job, ticket, lambda: pipeline(job)))
+
 @app.post("/code")
-async def run_code(req: CodeRequest):
-    return StreamingResponse(stream_agent(req.repoUrl, req.prompt), media_type="text/event-stream")
+async def run_code(req: CodeRequest, idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")):
+    if req.branch is not None and not is_agent_branch(req.branch):
+        return JSONResponse({"error": "Only backspace-agent-N branches can be continued"}, status_code=400)
+    key = await request_key(req, idempotency_key_header)
+
+    ticket = None
+    if jobs.find(key) is None:
+        try:
+            ticket = admission.enter()
+        except AdmissionRejected as e:
+            return JSONResponse(
+                {"error": str(e)},
+                status_code=429,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+
+    job, created = start_job(req, key, ticket)
+    return StreamingResponse(
+        subscribe(job, created),
+        media_type="text/event-stream",
+        headers={"X-Job-Id": job.id}
+    )
+
+@app.post("/batch")
+async def run_batch(req: BatchRequest):
+    repo_urls = list(dict.fromkeys(url.strip() for url in req.repoUrls if url.strip()))
+    invalid = [url for url in repo_urls if not re.match(REPO_URL_PATTERN, url)]
+    if not repo_urls or invalid or len(repo_urls) > batch.BATCH_MAX_REPOS:
+        return JSONResponse(
+            {"error": f"Expected 1 to {batch.BATCH_MAX_REPOS} GitHub repository URLs", "invalid": invalid},
+            status_code=400
+        )
+    parallel = max(1, min(req.parallel or batch.BATCH_MAX_PARALLEL, batch.BATCH_MAX_PARALLEL))
+    pool = sandbox.SandboxPool(size=parallel)
+
+    async def start_child(repo_url):
+        child = CodeRequest(repoUrl=repo_url, prompt=req.prompt)
+        key = await request_key(child, None)
+        ticket = None
+        if jobs.find(key) is None:
+            ticket = await admission.enter_when_possible(cancelled=lambda: batch_job.cancel_scope.cancelled)
+            if ticket is None:
+                return None
+        job, created = start_job(child, key, ticket, sandbox_pool=pool)
+        if ticket is not None and not created:
+            # An identical request started while we waited for the ticket, and we joined it instead
+            await admission.release(ticket)
+        return job, created
+
+    batch_job, _ = jobs.submit(
+        f"batch:{uuid.uuid4().hex}",
+        lambda job: batch.run_batch(job, repo_urls, start_child, jobs.stream, pool, parallel=parallel)
+    )
+    return StreamingResponse(
+        jobs.stream(batch_job),
+        media_type="text/event-stream",
+        headers={"X-Job-Id": batch_job.id}
+    )
+
+@app.post("/sessions")
+async def open_session(req: SessionRequest):
+    match = re.match(REPO_URL_PATTERN, req.repoUrl)
+    if not match:
+        return JSONResponse({"error": "Invalid GitHub URL"}, status_code=400)
+    username, repo_name = match.groups()
+    clone_url = GITHUB_CLONE_URL.format(token=GITHUB_TOKEN, owner=username, repo=repo_name)
+    try:
+        session = await sessions.open(req.repoUrl, username, repo_name, clone_url)
+    except SessionError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    return session.to_dict()
+
+@app.get("/sessions/{session_id}")
+async def session_info(session_id: str):
+    session = await sessions.get_live(session_id)
+    if session is None:
+        return JSONResponse({"error": "Unknown or expired session"}, status_code=404)
+    return session.to_dict()
+
+@app.post("/sessions/{session_id}/code")
+async def session_code(session_id: str, req: SessionPromptRequest):
+    session = await sessions.get_live(session_id)
+    if session is None:
+        return JSONResponse({"error": "Unknown or expired session"}, status_code=404)
+    code_req = CodeRequest(repoUrl=session.repo_url, prompt=req.prompt, trace=req.trace, record=req.record)
+    key = f"session:{session.id}:" + (req.idempotencyKey or idempotency_key(session.repo_url, req.prompt, session.base_sha))
+    job, created = start_job(code_req, key, None, session=session)
+    return StreamingResponse(
+        subscribe(job, created),
+        media_type="text/event-stream",
+        headers={"X-Job-Id": job.id}
+    )
+
+@app.delete("/sessions/{session_id}")
+async def close_session(session_id: str):
+    try:
+        session = sessions.close(session_id)
+    except SessionError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    if session is None:
+        return JSONResponse({"error": "Unknown or expired session"}, status_code=404)
+    return {**session.to_dict(), "closed": True}
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return {
+        **jobs.stats(),
+        "admission": admission.stats(),
+        "sessions": sessions.stats(),
+        "workspaces": workspaces.stats(),
+        "blob_cache": blob_cache.shared().stats(),
+        "repo_maps": repo_maps.shared().stats(),
+        "repo_metadata": publisher.shared().cache.stats(),
+        "dependency_cache": verify.shared().stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/jobs/{job_id}/trace")
+async def job_trace(job_id: str):
+    job = jobs.get(job_id)
+    if job is None or job.trace is None:
+        return JSONResponse({"error": "No trace recorded for this job"}, status_code=404)
+    return JSONResponse(
+        job.trace.to_chrome_trace(),
+        headers={"Content-Disposition": f'attachment; filename="job-{job_id}-trace.json"'}
+    )
+
+@app.get("/jobs/{job_id}/logs")
+async def job_logs(job_id: str, level: Optional[str] = None, limit: Optional[int] = None):
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return job.log.to_dict(level=level, limit=limit)
+
+@app.get("/jobs/{job_id}/cassette")
+async def job_cassette(job_id: str):
+    job = jobs.get(job_id)
+    if job is None or job.cassette is None:
+        return JSONResponse({"error": "No cassette recorded for this job"}, status_code=404)
+    return JSONResponse(
+        {"metadata": job.cassette.metadata, "interactions": job.cassette.interactions},
+        headers={"Content-Disposition": f'attachment; filename="job-{job_id}-cassette.json"'}
+    )
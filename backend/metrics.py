@@ -0,0 +1,247 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    labels = _format_labels(self.label_names, key, ("le", _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+JOB_LABELS = ("repo_size", "file_count", "model")
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "agent_stage_duration_seconds",
+    "Duration of each agent pipeline stage.",
+    ("stage",) + JOB_LABELS
+)
+JOB_SECONDS = REGISTRY.histogram(
+    "agent_job_duration_seconds",
+    "End-to-end duration of agent jobs.",
+    ("outcome",) + JOB_LABELS
+)
+JOBS_STARTED = REGISTRY.counter("agent_jobs_started_total", "Agent pipelines started.")
+JOBS_COALESCED = REGISTRY.counter("agent_jobs_coalesced_total", "Requests attached to an identical in-flight job.")
+JOBS_CANCELLED = REGISTRY.counter(
+    "agent_jobs_cancelled_total",
+    "Jobs cancelled before completion.",
+    ("reason", "policy")
+)
+
+
+def repo_size_bucket(file_count):
+    if file_count < 100:
+        return "small"
+    if file_count < 1000:
+        return "medium"
+    return "large"
+
+
+def file_count_bucket(file_count):
+    if file_count <= 1:
+        return str(file_count)
+    if file_count <= 3:
+        return "2-3"
+    if file_count <= 7:
+        return "4-7"
+    return "8+"
+
+
+class JobTimings:
+    """
+    Collects the stage durations of one job. Observations are buffered and flushed
+    to the histograms when the job finishes, so every stage carries the job's final labels.
+    """
+
+    def __init__(self, **labels):
+        self.started = time.perf_counter()
+        self.labels = {name: "unknown" for name in JOB_LABELS}
+        self.labels.update(labels)
+        self.stages = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def set_labels(self, **labels):
+        self.labels.update({name: str(value) for name, value in labels.items()})
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.stages.append((stage, seconds))
+
+    def summary(self):
+        stages = {}
+        with self._lock:
+            for stage, seconds in self.stages:
+                entry = stages.setdefault(stage, {"seconds": 0.0, "count": 0})
+                entry["seconds"] += seconds
+                entry["count"] += 1
+        for entry in stages.values():
+            entry["seconds"] = round(entry["seconds"], 3)
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "stages": stages,
+        }
+
+    def finish(self, outcome):
+        if self.finished:
+            return
+        self.finished = True
+        with self._lock:
+            for stage, seconds in self.stages:
+                STAGE_SECONDS.observe(seconds, stage=stage, **self.labels)
+        JOB_SECONDS.observe(time.perf_counter() - self.started, outcome=outcome, **self.labels)
+
+
+_current_job = contextvars.ContextVar("job_timings", default=None)
+
+
+def start_job(**labels):
+    """Starts timing a job in the current context; worker threads started with asyncio.to_thread inherit it."""
+    timings = JobTimings(**labels)
+    _current_job.set(timings)
+    return timings
+
+
+def current_job():
+    return _current_job.get()
+
+
+def set_job_labels(**labels):
+    timings = _current_job.get()
+    if timings is not None:
+        timings.set_labels(**labels)
+
+
+@contextmanager
+def stage(name):
+    """Times a pipeline stage and attributes it to the current job (and its trace, if one is recorded)."""
+    started = time.perf_counter()
+    try:
+        with tracing.span(name, cat="stage"):
+            yield
+    finally:
+        seconds = time.perf_counter() - started
+        timings = _current_job.get()
+        if timings is not None:
+            timings.record(name, seconds)
+        else:
+            STAGE_SECONDS.observe(seconds, stage=name, **{label: "unknown" for label in JOB_LABELS})
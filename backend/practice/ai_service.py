@@ -10,6 +10,7 @@ import aiohttp
 from typing import Dict, List, AsyncGenerator
 from dotenv import load_dotenv
 from e2b_code_interpreter import Sandbox
+from validators import ValidatorPipeline
 
 load_dotenv()
 
@@ -23,6 +24,11 @@ class AIService:
             raise ValueError("E2B_API_KEY not found in environment variables")
         self.base_url = "https://api.groq.com/openai/v1"
         self.model = "gemma2-9b-it"  # Using the same model as the working Colab implementation
+        self.validators = ValidatorPipeline()
+        # owner/repo -> default branch, so the base branch is looked up once per repository
+        self.default_branches: Dict[str, str] = {}
+        # Token usage reported by Groq, summed over every request this service made
+        self.usage: Dict[str, int] = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
     
     async def _make_ai_request(self, user_prompt: str, system_prompt: str) -> str:
         """Helper method to make AI requests"""
@@ -49,6 +55,10 @@ class AIService:
             ) as response:
                 if response.status == 200:
                     data = await response.json()
+                    tokens = data.get("usage") or {}
+                    self.usage["requests"] += 1
+                    self.usage["prompt_tokens"] += tokens.get("prompt_tokens", 0)
+                    self.usage["completion_tokens"] += tokens.get("completion_tokens", 0)
                     return data["choices"][0]["message"]["content"]
                 else:
                     error_text = await response.text()
@@ -269,17 +279,30 @@ Give the entire content of the file in a Python string.
         
         return "\n".join(code_parts)
     
-    def validate_generated_code(self, analysis: Dict) -> Dict:
+    def validate_generated_code(self, analysis: Dict, fail_fast: bool = False) -> Dict:
         """
         Step 5: Validate generated code for syntax and logic
         This ensures the generated code is safe and functional
         """
+        validation_results, files = self._prepare_validation(analysis)
+        report = self.validators.validate(files, fail_fast=fail_fast)
+        return self._apply_validation_report(validation_results, files, report)
+
+    async def validate_generated_code_async(self, analysis: Dict, fail_fast: bool = False) -> Dict:
+        """Step 5 (async): same checks as validate_generated_code, without blocking the event loop"""
+        validation_results, files = self._prepare_validation(analysis)
+        report = await self.validators.validate_async(files, fail_fast=fail_fast)
+        return self._apply_validation_report(validation_results, files, report)
+
+    def _prepare_validation(self, analysis: Dict):
+        """Checks paths and operations, and collects the file contents that can be parsed"""
         validation_results = {
             "valid": True,
             "warnings": [],
             "errors": [],
             "suggestions": []
         }
+        files = []
         
         for file_change in analysis.get("files", []):
             file_path = file_change.get("path", "")
@@ -301,21 +324,25 @@ Give the entire content of the file in a Python string.
             if not content and operation != "replace":
                 validation_results["warnings"].append(f"Empty content for {file_path} with operation {operation}")
             
-            # File type specific validation
-            file_type = self._get_file_type(file_path)
-            
-            if file_type == "html":
-                if not content.startswith('<') and not content.startswith('<!--'):
-                    validation_results["warnings"].append(f"HTML content for {file_path} doesn't start with HTML tag")
-            
-            elif file_type == "css":
-                if not any(char in content for char in ['{', ':', ';']):
-                    validation_results["warnings"].append(f"CSS content for {file_path} doesn't look like valid CSS")
-            
-            elif file_type == "javascript":
-                if not any(char in content for char in ['function', 'const', 'let', 'var', '//']):
-                    validation_results["warnings"].append(f"JavaScript content for {file_path} doesn't look like valid JS")
+            # Whole files are parsed; appended content is only a fragment, so its problems are warnings
+            if content and operation in ["create", "replace", "append"]:
+                files.append({"path": file_path, "content": content, "fragment": operation == "append"})
         
+        return validation_results, files
+
+    def _apply_validation_report(self, validation_results: Dict, files: List[Dict], report: Dict) -> Dict:
+        fragments = {f["path"] for f in files if f["fragment"]}
+        for result in report["results"]:
+            for error in result["errors"]:
+                message = f"{result['language']} error in {result['path']}: {error}"
+                if result["path"] in fragments:
+                    validation_results["warnings"].append(message)
+                else:
+                    validation_results["errors"].append(message)
+                    validation_results["valid"] = False
+        if report["cancelled"]:
+            validation_results["warnings"].append(f"Stopped after the first invalid file, {report['cancelled']} file(s) not checked")
+        validation_results["timings"] = report["timings"]
         return validation_results
     
     async def execute_in_sandbox(self, analysis: Dict, repo_url: str, branch_name: str) -> AsyncGenerator[str, None]:
@@ -403,6 +430,16 @@ Give the entire content of the file in a Python string.
         except Exception as e:
             yield f"❌ Error during execution: {e}"
     
+    async def get_default_branch(self, session: aiohttp.ClientSession, owner: str, repo: str, headers: Dict) -> str:
+        """Returns the repository's default branch, cached per repository"""
+        key = f"{owner}/{repo}".lower()
+        if key not in self.default_branches:
+            async with session.get(f"https://api.github.com/repos/{owner}/{repo}", headers=headers) as response:
+                if response.status != 200:
+                    raise Exception(f"Failed to detect default branch: {response.status} - {await response.text()}")
+                self.default_branches[key] = (await response.json())["default_branch"]
+        return self.default_branches[key]
+
     async def create_pull_request(self, repo_url: str, branch_name: str, analysis: Dict) -> str:
         """
         Step 7: Create pull request via GitHub API
@@ -438,7 +475,6 @@ This pull request contains AI-generated changes based on the user's request.
 *This PR was automatically generated by the Backspace Coding Agent*
                 """.strip(),
                 "head": branch_name,
-                "base": "main"
             }
             
             # GitHub API headers
@@ -450,6 +486,7 @@ This pull request contains AI-generated changes based on the user's request.
             
             # Create pull request
             async with aiohttp.ClientSession() as session:
+                pr_data["base"] = await self.get_default_branch(session, owner, repo, headers)
                 async with session.post(api_url, headers=headers, json=pr_data) as response:
                     if response.status == 201:
                         pr_data = await response.json()
@@ -487,7 +524,7 @@ This pull request contains AI-generated changes based on the user's request.
             
             # Step 2: Validate generated code
             yield "🔍 Validating generated code..."
-            validation = self.validate_generated_code(analysis)
+            validation = await self.validate_generated_code_async(analysis)
             
             if not validation["valid"]:
                 yield "❌ Code validation failed!"
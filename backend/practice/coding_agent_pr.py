@@ -374,6 +374,21 @@ else:
 
 import requests
 
+def get_default_branch(token, username, repo_name):
+    """
+    Returns the repository's default branch (e.g. 'main' or 'master') using GitHub REST API v3.
+    """
+    url = f"https://api.github.com/repos/{username}/{repo_name}"
+    headers = {
+        "Authorization": f"token {token}",
+        "Accept": "application/vnd.github+json"
+    }
+    response = requests.get(url, headers=headers)
+    if response.status_code == 200:
+        return response.json().get("default_branch", "main")
+    print(f"\n⚠️ Could not detect the default branch (Status Code: {response.status_code}), assuming 'main'")
+    return "main"
+
 def create_pull_request(token, username, repo_name, source_branch, target_branch, title, body=""):
     """
     Creates a pull request using GitHub REST API v3.
@@ -407,7 +422,7 @@ create_pull_request(
     username=username,
     repo_name=repo_name,
     source_branch=new_branch_name,
-    target_branch="main",  # Or 'master' depending on the repo
+    target_branch=get_default_branch(github_token, username, repo_name),
     title=pr_title,
     body=f"Automated PR: {edit_prompt}"
 )
\ No newline at end of file
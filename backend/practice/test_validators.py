@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Regression cases for the validator pipeline's hand-written CSS and JavaScript checks
+
+Usage (from the practice directory):
+    python -m pytest -q test_validators.py
+    python test_validators.py
+"""
+
+from validators import validate_css, _check_brackets
+
+
+def test_css_semicolon_inside_url_is_not_a_declaration_end():
+    assert validate_css("a{background:url(data:image/png;base64,iVBORw0KGgo=)}") == []
+    assert validate_css('a{background:url("data:image/png;base64,iVBORw0KGgo=");color:red}') == []
+
+
+def test_css_invalid_declarations_are_still_reported():
+    assert validate_css("a{color:red;b}") == ["line 1: invalid declaration 'b'"]
+    assert validate_css("a{background:url(x.png);b}") == ["line 1: invalid declaration 'b'"]
+
+
+def test_js_fallback_skips_regex_literals():
+    assert _check_brackets("const r = /[(]/; x()") == []
+    assert _check_brackets("if (x) { return /}/.test(y) }") == []
+    assert _check_brackets("f(/\\)/g)") == []
+
+
+def test_js_fallback_keeps_division_and_real_errors():
+    assert _check_brackets("let a = b / c / d; f(a)") == []
+    assert _check_brackets("x = a[1] / 2; y = (3)") == []
+    assert _check_brackets("const r = /[(]/; x(") == ["line 1: unclosed ("]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Practice: Validator pipeline for generated files
+Parses generated Python, JSON, HTML, CSS and JavaScript with real parsers, in a process pool
+"""
+
+import ast
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+VALIDATOR_WORKERS = int(os.getenv("VALIDATOR_WORKERS", str(min(8, os.cpu_count() or 2))))
+VALIDATOR_TIMEOUT = float(os.getenv("VALIDATOR_TIMEOUT", "10"))
+
+LANGUAGES = {
+    "py": "python",
+    "json": "json",
+    "html": "html",
+    "htm": "html",
+    "css": "css",
+    "js": "javascript",
+    "mjs": "javascript",
+    "cjs": "javascript",
+}
+
+
+def language_for(file_path: str) -> Optional[str]:
+    ext = file_path.lower().rsplit(".", 1)[-1] if "." in file_path else ""
+    return LANGUAGES.get(ext)
+
+
+def validate_python(content: str) -> List[str]:
+    try:
+        compile(ast.parse(content), "<generated>", "exec")
+    except SyntaxError as e:
+        return [f"line {e.lineno}: {e.msg}"]
+    except ValueError as e:
+        return [str(e)]
+    return []
+
+
+def validate_json(content: str) -> List[str]:
+    try:
+        json.loads(content)
+    except ValueError as e:
+        return [str(e)]
+    return []
+
+
+class _TagBalanceParser(HTMLParser):
+    """Tracks open elements and reports tags that are closed out of order or never closed."""
+
+    VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+    # Elements whose end tag HTML lets you omit
+    OPTIONAL_END = {"p", "li", "dt", "dd", "tr", "td", "th", "thead", "tbody", "tfoot", "option", "optgroup",
+                    "colgroup", "caption", "rb", "rt", "rp", "rtc", "html", "head", "body"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.errors = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in self.VOID:
+            self.stack.append((tag, self.getpos()[0]))
+
+    def handle_endtag(self, tag):
+        if tag in self.VOID:
+            return
+        line = self.getpos()[0]
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            self.errors.append(f"line {line}: </{tag}> without a matching <{tag}>")
+            return
+        while self.stack:
+            open_tag, opened_at = self.stack.pop()
+            if open_tag == tag:
+                return
+            if open_tag not in self.OPTIONAL_END:
+                self.errors.append(f"line {line}: <{open_tag}> opened on line {opened_at} is not closed before </{tag}>")
+
+    def close(self):
+        super().close()
+        for tag, opened_at in self.stack:
+            if tag not in self.OPTIONAL_END:
+                self.errors.append(f"line {opened_at}: <{tag}> is never closed")
+
+
+def validate_html(content: str) -> List[str]:
+    parser = _TagBalanceParser()
+    parser.feed(content)
+    parser.close()
+    return parser.errors
+
+
+def validate_css(content: str) -> List[str]:
+    """
+    Tokenizes the stylesheet (comments, strings, blocks) and checks that blocks are balanced and
+    that every declaration inside a rule has the `property: value` form.
+    """
+    errors = []
+    depth = 0
+    line = 1
+    i = 0
+    statement = ""
+    blocks = []  # True for blocks that hold declarations, False for @media-style nesting blocks
+    parens = 0  # A ; inside url(...) or another function, e.g. a data URI, doesn't end the declaration
+    while i < len(content):
+        char = content[i]
+        if content.startswith("/*", i):
+            end = content.find("*/", i + 2)
+            if end == -1:
+                errors.append(f"line {line}: unterminated comment")
+                break
+            line += content.count("\n", i, end)
+            i = end + 2
+            continue
+        if char in "\"'":
+            end = i + 1
+            while end < len(content) and content[end] != char and content[end] != "\n":
+                end += 2 if content[end] == "\\" else 1
+            if end >= len(content) or content[end] != char:
+                errors.append(f"line {line}: unterminated string")
+            statement += content[i:end + 1]
+            i = end + 1
+            continue
+        if char == "\n":
+            line += 1
+        if char == "{":
+            selector = statement.strip()
+            if not selector:
+                errors.append(f"line {line}: block without a selector")
+            nested = selector.startswith("@") and not selector.startswith(("@font-face", "@page"))
+            blocks.append(not nested)
+            depth += 1
+            statement = ""
+            parens = 0
+        elif char == "}":
+            if depth == 0:
+                errors.append(f"line {line}: unexpected }}")
+            else:
+                errors.extend(_check_declaration(statement, line, blocks[-1]))
+                blocks.pop()
+                depth -= 1
+            statement = ""
+            parens = 0
+        elif char == ";" and not parens:
+            if depth and blocks[-1]:
+                errors.extend(_check_declaration(statement, line, True))
+            statement = ""
+        else:
+            if char == "(":
+                parens += 1
+            elif char == ")" and parens:
+                parens -= 1
+            statement += char
+        i += 1
+    if depth:
+        errors.append(f"line {line}: {depth} unclosed block(s)")
+    return errors
+
+
+def _check_declaration(text: str, line: int, in_rule: bool) -> List[str]:
+    declaration = text.strip()
+    if not declaration or not in_rule:
+        return []
+    name, sep, value = declaration.partition(":")
+    if not sep or not name.strip() or not value.strip():
+        return [f"line {line}: invalid declaration {declaration[:60]!r}"]
+    return []
+
+
+def validate_javascript(content: str) -> List[str]:
+    """
+    Parses with esprima when it is installed, otherwise with `node --check` when Node.js is on
+    the PATH; without either, only bracket balance (outside strings and comments) is checked.
+    """
+    try:
+        import esprima
+    except ImportError:
+        esprima = None
+    if esprima is not None:
+        try:
+            esprima.parseModule(content)
+        except esprima.Error as module_error:
+            try:
+                esprima.parseScript(content)
+            except esprima.Error:
+                return [str(module_error)]
+        return []
+
+    node = shutil.which("node")
+    if node:
+        with tempfile.NamedTemporaryFile("w", suffix=".mjs" if "import " in content or "export " in content else ".js",
+                                         delete=False, encoding="utf-8") as f:
+            f.write(content)
+        try:
+            completed = subprocess.run([node, "--check", f.name], capture_output=True, text=True, timeout=VALIDATOR_TIMEOUT)
+        finally:
+            os.unlink(f.name)
+        if completed.returncode != 0:
+            lines = [l for l in completed.stderr.splitlines() if l.strip()]
+            message = next((l for l in lines if "Error" in l), lines[-1] if lines else "syntax error")
+            location = lines[0].rsplit(":", 1)[-1] if lines and ":" in lines[0] else "?"
+            return [f"line {location}: {message.strip()}"]
+        return []
+
+    return _check_brackets(content)
+
+
+# After these characters or keywords a / starts a regex literal rather than a division
+REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+REGEX_KEYWORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await"}
+
+
+def _regex_end(content: str, start: int) -> int:
+    """Returns the index after the regex literal starting at `start`, or -1 if there isn't one."""
+    i = start + 1
+    in_class = False
+    while i < len(content) and content[i] != "\n":
+        char = content[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            i += 1
+            while i < len(content) and content[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    return -1
+
+
+def _check_brackets(content: str) -> List[str]:
+    """Bracket balance outside strings, comments and regex literals; a heuristic, not a parser."""
+    pairs = {")": "(", "]": "[", "}": "{"}
+    stack = []
+    line = 1
+    i = 0
+    previous = ""  # Last significant character, or the last word when it ended with a letter
+    while i < len(content):
+        char = content[i]
+        if content.startswith("//", i):
+            i = content.find("\n", i)
+            i = len(content) if i == -1 else i
+            continue
+        if content.startswith("/*", i):
+            end = content.find("*/", i + 2)
+            i = len(content) if end == -1 else end + 2
+            continue
+        if char in "\"'`":
+            end = i + 1
+            while end < len(content) and content[end] != char:
+                end += 2 if content[end] == "\\" else 1
+            line += content.count("\n", i, end)
+            i = end + 1
+            previous = char
+            continue
+        if char == "/" and (not previous or previous in REGEX_PRECEDERS or previous in REGEX_KEYWORDS):
+            end = _regex_end(content, i)
+            if end != -1:
+                i = end
+                previous = "/"
+                continue
+        if char.isalnum() or char in "_$":
+            end = i
+            while end < len(content) and (content[end].isalnum() or content[end] in "_$"):
+                end += 1
+            previous = content[i:end]
+            i = end
+            continue
+        if not char.isspace():
+            previous = char
+        if char == "\n":
+            line += 1
+        elif char in "([{":
+            stack.append((char, line))
+        elif char in pairs:
+            if not stack or stack[-1][0] != pairs[char]:
+                return [f"line {line}: unexpected {char}"]
+            stack.pop()
+        i += 1
+    return [f"line {opened}: unclosed {char}" for char, opened in stack[:1]]
+
+
+VALIDATORS = {
+    "python": validate_python,
+    "json": validate_json,
+    "html": validate_html,
+    "css": validate_css,
+    "javascript": validate_javascript,
+}
+
+
+def run_validator(language: str, file_path: str, content: str) -> Dict:
+    """Runs one validator; executed in a worker process, so it must stay a module-level function."""
+    started = time.perf_counter()
+    try:
+        errors = VALIDATORS[language](content)
+    except Exception as e:
+        errors = [f"validator crashed: {e}"]
+    return {
+        "path": file_path,
+        "language": language,
+        "valid": not errors,
+        "errors": errors,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+class ValidatorPipeline:
+    """
+    Validates batches of generated files in parallel in a process pool, so parsing large
+    batches neither holds the GIL of the serving process nor blocks its event loop.
+    With fail_fast, validation stops at the first invalid file and pending work is cancelled.
+    """
+
+    def __init__(self, workers: int = VALIDATOR_WORKERS):
+        self.workers = workers
+        self._pool = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _submit(self, files: List[Dict]):
+        futures = []
+        skipped = []
+        for f in files:
+            language = language_for(f["path"])
+            if language is None:
+                skipped.append(f["path"])
+                continue
+            futures.append(self.pool.submit(run_validator, language, f["path"], f["content"]))
+        return futures, skipped
+
+    def validate(self, files: List[Dict], fail_fast: bool = False) -> Dict:
+        """Validates [{"path": ..., "content": ...}, ...] and returns a report (blocking)."""
+        started = time.perf_counter()
+        futures, skipped = self._submit(files)
+        results = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+            if fail_fast and any(not r["valid"] for r in results):
+                for future in pending:
+                    future.cancel()
+                break
+        return self._report(results, skipped, len(futures) - len(results), started)
+
+    async def validate_async(self, files: List[Dict], fail_fast: bool = False) -> Dict:
+        """Like validate(), but awaits the pool instead of blocking the event loop."""
+        started = time.perf_counter()
+        futures, skipped = self._submit(files)
+        results = []
+        pending = {asyncio.wrap_future(future) for future in futures}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+            if fail_fast and any(not r["valid"] for r in results):
+                for future in pending:
+                    future.cancel()
+                break
+        return self._report(results, skipped, len(futures) - len(results), started)
+
+    def _report(self, results: List[Dict], skipped: List[str], cancelled: int, started: float) -> Dict:
+        timings = {}
+        for r in results:
+            entry = timings.setdefault(r["language"], {"files": 0, "seconds": 0.0, "max_seconds": 0.0})
+            entry["files"] += 1
+            entry["seconds"] = round(entry["seconds"] + r["seconds"], 4)
+            entry["max_seconds"] = max(entry["max_seconds"], r["seconds"])
+        return {
+            "valid": all(r["valid"] for r in results),
+            "results": sorted(results, key=lambda r: r["path"]),
+            "skipped": skipped,
+            "cancelled": cancelled,
+            "timings": timings,
+            "wall_seconds": round(time.perf_counter() - started, 4),
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
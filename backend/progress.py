@@ -0,0 +1,60 @@
+import asyncio
+import contextvars
+
+import logs
+
+
+class ProgressChannel:
+    """
+    Carries progress events from a worker thread to the job's SSE stream. publish() may be
+    called from any thread; events are handed to the event loop with call_soon_threadsafe.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, loop=None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def publish(self, event):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, self._CLOSED)
+
+    async def events(self):
+        """Yields events as they arrive until the channel is closed."""
+        while True:
+            event = await self.queue.get()
+            if event is self._CLOSED:
+                return
+            yield event
+
+
+_current = contextvars.ContextVar("progress_channel", default=None)
+
+
+def activate(channel):
+    _current.set(channel)
+
+
+def emit(type, message, **fields):
+    """
+    Reports a progress event for the current job, e.g. emit("file_started", "📝 Modifying file: app.js", file="app.js").
+    The event is also logged, so the server console keeps showing progress.
+    """
+    logs.info(type, message, **fields)
+    channel = _current.get()
+    if channel is not None:
+        channel.publish({"type": type, "message": message, **fields})
+
+
+def diff_stats(diff_lines):
+    """Counts added and removed lines in `git diff` output."""
+    additions = deletions = 0
+    for line in "".join(diff_lines).splitlines():
+        if line.startswith("+") and not line.startswith("+++"):
+            additions += 1
+        elif line.startswith("-") and not line.startswith("---"):
+            deletions += 1
+    return {"additions": additions, "deletions": deletions}
@@ -0,0 +1,261 @@
+import asyncio
+import os
+import threading
+import time
+
+import requests
+
+import cassette
+import executors
+import logs
+import metrics
+from branch import find_pull_request
+from github_client import GitHubAPIError, get_client
+
+PR_PUBLISH_ATTEMPTS = int(os.getenv("PR_PUBLISH_ATTEMPTS", "3"))
+PR_RETRY_BACKOFF = float(os.getenv("PR_RETRY_BACKOFF", "1.0"))
+# How long a repository's default branch, node id and labels are trusted before being fetched again
+REPO_METADATA_TTL = float(os.getenv("REPO_METADATA_TTL", "3600"))
+# Defaults for requests that don't set their own
+PR_LABELS = [label.strip() for label in os.getenv("PR_LABELS", "").split(",") if label.strip()]
+PR_REVIEWERS = [login.strip() for login in os.getenv("PR_REVIEWERS", "").split(",") if login.strip()]
+PR_DRAFT = os.getenv("PR_DRAFT", "false").lower() in ("1", "true", "yes")
+
+PR_PUBLISHED = metrics.REGISTRY.counter(
+    "agent_pull_requests_published_total",
+    "Pull requests opened by the publisher, by outcome (created, existing or failed).",
+    ("result",)
+)
+GITHUB_ROUND_TRIPS = metrics.REGISTRY.counter(
+    "agent_publish_round_trips_total",
+    "GitHub API round trips made while publishing pull requests, retries included."
+)
+
+REPOSITORY_QUERY = """
+query RepositoryMetadata($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    id
+    defaultBranchRef { name }
+    labels(first: 100) { nodes { id name } }
+  }
+%s}
+"""
+
+CREATE_PULL_REQUEST = """
+mutation CreatePullRequest($repositoryId: ID!, $base: String!, $head: String!, $title: String!, $body: String!, $draft: Boolean!) {
+  createPullRequest(input: {repositoryId: $repositoryId, baseRefName: $base, headRefName: $head, title: $title, body: $body, draft: $draft}) {
+    pullRequest { id number url isDraft }
+  }
+}
+"""
+
+ADD_LABELS = "  addLabelsToLabelable(input: {labelableId: $pullRequestId, labelIds: $labelIds}) { clientMutationId }\n"
+REQUEST_REVIEWS = "  requestReviews(input: {pullRequestId: $pullRequestId, userIds: $userIds}) { clientMutationId }\n"
+
+
+class PublishError(Exception):
+    pass
+
+
+def _retryable(error):
+    if isinstance(error, requests.RequestException):
+        return True
+    if isinstance(error, GitHubAPIError):
+        message = str(error).lower()
+        return error.status_code >= 500 or error.status_code == 429 or "rate limit" in message or "rate_limited" in message
+    return False
+
+
+class RepoMetadataCache:
+    """Default branch, node id, label ids and reviewer ids per repository, trusted for REPO_METADATA_TTL."""
+
+    def __init__(self, ttl=REPO_METADATA_TTL):
+        self.ttl = ttl
+        self.repos = {}
+        self.users = {}
+        self._lock = threading.Lock()
+
+    def get(self, owner, repo):
+        with self._lock:
+            entry = self.repos.get(f"{owner}/{repo}".lower())
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def put(self, owner, repo, metadata):
+        with self._lock:
+            self.repos[f"{owner}/{repo}".lower()] = (metadata, time.time())
+
+    def user_ids(self, logins):
+        with self._lock:
+            return {login: self.users[login.lower()] for login in logins if login.lower() in self.users}
+
+    def put_users(self, ids):
+        with self._lock:
+            self.users.update({login.lower(): user_id for login, user_id in ids.items()})
+
+    def stats(self):
+        with self._lock:
+            return {"repositories": len(self.repos), "users": len(self.users)}
+
+
+class PullRequestPublisher:
+    """
+    Opens pull requests with GitHub's GraphQL API in as few round trips as possible: one query
+    for the repository's default branch, node id, label ids and reviewer ids (skipped while cached),
+    one mutation creating the PR (as a draft if asked), and one mutation applying labels and
+    reviewers together. Calls run on the GitHub executor and are retried with exponential backoff.
+    """
+
+    def __init__(self, attempts=PR_PUBLISH_ATTEMPTS, backoff=PR_RETRY_BACKOFF):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.cache = RepoMetadataCache()
+
+    async def _call(self, token, query, variables, stats, ignore_errors=()):
+        client = get_client(token)
+        for attempt in range(1, self.attempts + 1):
+            stats["round_trips"] += 1
+            GITHUB_ROUND_TRIPS.inc()
+            try:
+                return await executors.github(client.graphql, query, variables, ignore_errors)
+            except Exception as e:
+                if attempt == self.attempts or not _retryable(e):
+                    raise
+                delay = self.backoff * 2 ** (attempt - 1)
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after and str(retry_after).isdigit():
+                    delay = max(delay, float(retry_after))
+                logs.warning("github_retry", f"⚠️ GitHub call failed ({e}), retrying in {delay:.1f}s", attempt=attempt)
+                await asyncio.sleep(delay)
+
+    async def metadata(self, token, owner, repo, reviewers=(), stats=None, refresh=False):
+        """Returns {"id", "default_branch", "labels": {name: id}} and caches reviewer ids on the way."""
+        stats = stats if stats is not None else {"round_trips": 0}
+        # Recorded jobs must contain every call, so cassettes skip the cache like the ETag cache does
+        recording = cassette.current() is not None
+        cached = self.cache.get(owner, repo) if not refresh and not recording else None
+        known = self.cache.user_ids(reviewers) if not recording else {}
+        missing = [login for login in reviewers if login not in known]
+        if cached is not None and not missing:
+            return cached
+
+        users = "".join(f"  user{i}: user(login: $login{i}) {{ id login }}\n" for i in range(len(missing)))
+        declarations = "".join(f", $login{i}: String!" for i in range(len(missing)))
+        query = REPOSITORY_QUERY.replace("$name: String!)", f"$name: String!{declarations})", 1) % users
+        variables = {"owner": owner, "name": repo, **{f"login{i}": login for i, login in enumerate(missing)}}
+        # Unknown reviewer logins come back as null users with NOT_FOUND errors
+        data = await self._call(token, query, variables, stats, ignore_errors=("NOT_FOUND",) if missing else ())
+
+        if data.get("repository") is None:
+            raise GitHubAPIError(404, f"Repository {owner}/{repo} not found")
+        repository = data["repository"]
+        metadata = {
+            "id": repository["id"],
+            "default_branch": (repository.get("defaultBranchRef") or {}).get("name") or "main",
+            "labels": {label["name"].lower(): label["id"] for label in repository["labels"]["nodes"]},
+        }
+        self.cache.put(owner, repo, metadata)
+        self.cache.put_users({
+            data[f"user{i}"]["login"]: data[f"user{i}"]["id"] for i in range(len(missing)) if data.get(f"user{i}")
+        })
+        return metadata
+
+    async def default_branch(self, token, owner, repo):
+        return (await self.metadata(token, owner, repo))["default_branch"]
+
+    async def publish(self, token, owner, repo, head, title, body, labels=None, reviewers=None, draft=None):
+        """
+        Opens a PR from `head` into the repository's default branch and applies labels, reviewers
+        and draft status. Labels that don't exist in the repository and unknown reviewers are
+        reported in `warnings` rather than failing the PR. If a retried create finds the PR already
+        open (the first attempt succeeded after all), that PR is returned.
+        """
+        labels = PR_LABELS if labels is None else labels
+        reviewers = PR_REVIEWERS if reviewers is None else reviewers
+        draft = PR_DRAFT if draft is None else draft
+        stats = {"round_trips": 0}
+        warnings = []
+
+        try:
+            before = stats["round_trips"]
+            metadata = await self.metadata(token, owner, repo, reviewers, stats)
+            if stats["round_trips"] == before and any(label.lower() not in metadata["labels"] for label in labels):
+                # The label may have been created since the metadata was cached
+                metadata = await self.metadata(token, owner, repo, reviewers, stats, refresh=True)
+        except (GitHubAPIError, requests.RequestException) as e:
+            PR_PUBLISHED.inc(result="failed")
+            raise PublishError(f"Could not read the metadata of {owner}/{repo}: {e}") from e
+        label_ids = []
+        for label in labels:
+            if label.lower() in metadata["labels"]:
+                label_ids.append(metadata["labels"][label.lower()])
+            else:
+                warnings.append(f"label {label!r} does not exist in {owner}/{repo}")
+        user_ids = self.cache.user_ids(reviewers)
+        warnings.extend(f"reviewer {login!r} not found" for login in reviewers if login not in user_ids)
+
+        try:
+            data = await self._call(token, CREATE_PULL_REQUEST, {
+                "repositoryId": metadata["id"], "base": metadata["default_branch"], "head": head,
+                "title": title, "body": body, "draft": draft,
+            }, stats)
+            pull = data["createPullRequest"]["pullRequest"]
+            result = "created"
+        except (GitHubAPIError, requests.RequestException) as e:
+            if not isinstance(e, GitHubAPIError) or "already exists" not in str(e):
+                PR_PUBLISHED.inc(result="failed")
+                raise PublishError(f"Failed to create pull request: {e}") from e
+            existing = await executors.github(find_pull_request, token, owner, repo, head)
+            stats["round_trips"] += 1
+            if not existing:
+                PR_PUBLISHED.inc(result="failed")
+                raise PublishError(f"Failed to create pull request: {e}") from e
+            pull = {"id": existing.get("node_id"), "number": existing["number"], "url": existing["html_url"], "isDraft": existing.get("draft", False)}
+            result = "existing"
+
+        if pull.get("id") and (label_ids or user_ids):
+            declarations = ["$pullRequestId: ID!"]
+            fields = ""
+            variables = {"pullRequestId": pull["id"]}
+            if label_ids:
+                declarations.append("$labelIds: [ID!]!")
+                fields += ADD_LABELS
+                variables["labelIds"] = label_ids
+            if user_ids:
+                declarations.append("$userIds: [ID!]")
+                fields += REQUEST_REVIEWS
+                variables["userIds"] = list(user_ids.values())
+            mutation = f"mutation DecoratePullRequest({', '.join(declarations)}) {{\n{fields}}}\n"
+            try:
+                await self._call(token, mutation, variables, stats)
+            except Exception as e:
+                # The PR exists; missing labels or reviewers shouldn't turn the job into a failure
+                warnings.append(f"could not apply labels or reviewers: {e}")
+                label_ids, user_ids = [], {}
+
+        PR_PUBLISHED.inc(result=result)
+        return {
+            "number": pull["number"],
+            "url": pull["url"],
+            "base": metadata["default_branch"],
+            "draft": pull.get("isDraft", draft),
+            "labels": [label for label in labels if label.lower() in metadata["labels"]] if label_ids else [],
+            "reviewers": list(user_ids),
+            "round_trips": stats["round_trips"],
+            "existing": result == "existing",
+            "warnings": warnings,
+        }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """Returns the process-wide publisher, created on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PullRequestPublisher()
+        return _shared
@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import logs
+import metrics
+import scanner
+
+REPO_MAP_MEMORY_ENTRIES = int(os.getenv("REPO_MAP_MEMORY_ENTRIES", "32"))
+REPO_MAP_DISK_MB = float(os.getenv("REPO_MAP_DISK_MB", "256"))
+# Shared by every worker process on the host; set to an empty string to keep maps in memory only
+REPO_MAP_DIR = os.getenv("REPO_MAP_DIR", os.path.join(tempfile.gettempdir(), "backspace-agent-repo-maps"))
+
+REPO_MAP_LOOKUPS = metrics.REGISTRY.counter(
+    "agent_repo_map_lookups_total",
+    "Repository map lookups by owner/repo@commit, by where they were served from.",
+    ("result",)
+)
+
+
+def map_key(owner, repo, sha):
+    """Returns owner/repo@sha, or None unless `sha` is a full commit SHA; anything else (a branch name) can move."""
+    if not re.fullmatch(r"[0-9a-fA-F]{40}", sha or ""):
+        return None
+    return f"{owner}/{repo}@{sha}".lower()
+
+
+class RepoMapCache:
+    """
+    Scans of clean clones (see scanner.RepoScan), keyed by owner/repo@commit-sha. A commit never
+    changes, so a job on a commit some earlier job already scanned skips the scan entirely.
+    Maps live in a small memory LRU in front of gzipped JSON files on disk, which every worker
+    process on the host shares; the disk store has a byte budget enforced by LRU on file mtimes.
+    Keys include the scanner's rules fingerprint, so maps made under other rules are never served.
+    """
+
+    def __init__(self, memory_entries=REPO_MAP_MEMORY_ENTRIES, disk_dir=REPO_MAP_DIR,
+                 disk_bytes=REPO_MAP_DISK_MB * 1024 * 1024):
+        self.memory_entries = memory_entries
+        self.disk_dir = disk_dir or None
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.disk_used = sum(size for _, size, _ in self._disk_entries())
+        self.stats_counts = {"memory": 0, "disk": 0, "miss": 0}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        name = hashlib.sha256(f"{key}|{scanner.rules_fingerprint()}".encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.json.gz")
+
+    def _disk_entries(self):
+        """Returns [(mtime, size, path)] of the stored maps."""
+        if not self.disk_dir or not os.path.isdir(self.disk_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def get(self, key):
+        """Returns the cached RepoScan for a commit, or None."""
+        with self._lock:
+            repo_scan = self.memory.get(key)
+            if repo_scan is not None:
+                self.memory.move_to_end(key)
+                return self._hit("memory", repo_scan)
+
+        if self.disk_dir:
+            path = self._path(key)
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    data = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                data = None
+            if data is not None:
+                repo_scan = scanner.RepoScan.from_dict(data)
+                self._remember(key, repo_scan)
+                with self._lock:
+                    return self._hit("disk", repo_scan)
+
+        with self._lock:
+            self.stats_counts["miss"] += 1
+        REPO_MAP_LOOKUPS.inc(result="miss")
+        return None
+
+    def _hit(self, tier, repo_scan):
+        self.stats_counts[tier] += 1
+        REPO_MAP_LOOKUPS.inc(result=tier)
+        return repo_scan
+
+    def put(self, key, repo_scan):
+        self._remember(key, repo_scan)
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        data = gzip.compress(json.dumps(repo_scan.to_dict(), separators=(",", ":")).encode("utf-8"))
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logs.warning("repo_map_write_failed", f"⚠️ Could not write the repo map of {key} to disk: {e}")
+            return
+        with self._lock:
+            self.disk_used += len(data)
+            over_budget = self.disk_used > self.disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _remember(self, key, repo_scan):
+        with self._lock:
+            self.memory[key] = repo_scan
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """Deletes the least recently used maps until the store is back under 90% of its budget."""
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self.disk_used = total
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self.stats_counts.values())
+            hits = self.stats_counts["memory"] + self.stats_counts["disk"]
+            return {
+                **self.stats_counts,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "disk_bytes": self.disk_used,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """Returns the process-wide cache, created on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RepoMapCache()
+        return _shared
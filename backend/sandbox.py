@@ -0,0 +1,147 @@
+import os
+
+import cancellation
+import cassette
+import executors
+import logs
+import tracing
+
+SANDBOX_TIMEOUT = int(os.getenv("SANDBOX_TIMEOUT", "180"))
+
+
+def _e2b_sandbox():
+    from e2b_code_interpreter import Sandbox
+    return Sandbox(api_key=os.getenv("E2B_API_KEY"), timeout=SANDBOX_TIMEOUT)
+
+
+_factory = _e2b_sandbox
+
+
+def set_factory(factory):
+    """Replaces the sandbox backend, e.g. with a local executor for offline benchmarks."""
+    global _factory
+    _factory = factory
+
+
+def create():
+    if cassette.replaying():
+        return cassette.ReplaySandbox()
+    return _factory()
+
+
+async def create_async():
+    """create() on the sandbox executor; starting a sandbox is a blocking network round trip."""
+    return await executors.run_in(executors.SANDBOX_EXECUTOR, create)
+
+
+def run_code(sbx, code, cancellable=True):
+    """
+    Runs code in the sandbox and records the call in the job's trace.
+    Raises JobCancelled instead of running anything once the job has been cancelled,
+    unless `cancellable` is False (used to save partial work after a cancel).
+    """
+    if cancellable:
+        cancellation.check()
+    with tracing.span("run_code", cat="sandbox", code=code[:200]) as span:
+        try:
+            execution = cassette.intercept(
+                "sandbox", code, {"code": code},
+                lambda: sbx.run_code(code),
+                cassette.serialize_execution, cassette.deserialize_execution
+            )
+        except Exception:
+            if cancellable:
+                cancellation.check()
+            raise
+        span["stdout_lines"] = len(execution.logs.stdout)
+        span["stderr_lines"] = len(execution.logs.stderr)
+        return execution
+
+
+async def run_code_async(sbx, code, cancellable=True):
+    """run_code() on the bounded sandbox executor, for callers running on the event loop."""
+    return await executors.run_in(executors.SANDBOX_EXECUTOR, run_code, sbx, code, cancellable)
+
+
+def upload(sbx, path, data):
+    """Writes `data` (bytes or a binary file object) to `path` in the sandbox."""
+    cancellation.check()
+    with tracing.span("upload", cat="sandbox", path=path):
+        sbx.files.write(path, data)
+
+
+def download(sbx, path):
+    """Returns the bytes of the file at `path` in the sandbox."""
+    cancellation.check()
+    with tracing.span("download", cat="sandbox", path=path) as span:
+        data = bytes(sbx.files.read(path, format="bytes"))
+        span["bytes"] = len(data)
+        return data
+
+
+def set_timeout(sbx, seconds):
+    """Makes the sandbox live `seconds` from now; backends without a fixed lifetime ignore it."""
+    if hasattr(sbx, "set_timeout"):
+        sbx.set_timeout(int(seconds))
+
+
+def is_running(sbx):
+    """Health check of the sandbox; a blocking round trip on E2B, so async callers use the sandbox executor."""
+    try:
+        return getattr(sbx, "is_running", lambda: True)()
+    except Exception:
+        return False
+
+
+def kill_in_background(sbx):
+    """Schedules sbx.kill() on the sandbox executor; safe to call from the event loop."""
+    executors.SANDBOX_EXECUTOR.submit(kill, sbx)
+
+
+def kill(sbx):
+    try:
+        sbx.kill()
+    except Exception as e:
+        logs.warning("sandbox_kill_failed", f"⚠️ Failed to stop sandbox: {e}")
+
+
+class SandboxPool:
+    """
+    Reuses sandboxes across jobs, e.g. the repositories of one batch, so each job doesn't pay for
+    starting a fresh sandbox. Released sandboxes have the job's checkout removed and are kept
+    idle, up to `size` of them; the rest are killed.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.idle = []
+        self.created = 0
+        self.reused = 0
+
+    async def acquire(self):
+        while self.idle:
+            sbx = self.idle.pop()
+            if await executors.run_in(executors.SANDBOX_EXECUTOR, is_running, sbx):
+                self.reused += 1
+                return sbx
+        self.created += 1
+        return await create_async()
+
+    async def release(self, sbx, workdir, reusable=True):
+        """Returns a sandbox to the pool after deleting `workdir`, or kills it when it can't be reused."""
+        if reusable and len(self.idle) < self.size:
+            try:
+                await run_code_async(sbx, f"!( rm -rf {workdir} )", cancellable=False)
+                self.idle.append(sbx)
+                return
+            except Exception as e:
+                logs.warning("sandbox_clean_failed", f"⚠️ Could not clean sandbox for reuse: {e}")
+        kill_in_background(sbx)
+
+    def close(self):
+        for sbx in self.idle:
+            kill_in_background(sbx)
+        self.idle = []
+
+    def stats(self):
+        return {"size": self.size, "created": self.created, "reused": self.reused}
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import time
+
+import metrics
+from sandbox import run_code
+
+# Files larger than this are left out of the routing prompt
+SCAN_MAX_FILE_KB = float(os.getenv("SCAN_MAX_FILE_KB", "256"))
+
+VENDOR_DIRS = {
+    ".git", "node_modules", "bower_components", "jspm_packages", "vendor", "third_party",
+    "dist", "build", "out", "target", ".next", ".nuxt", ".svelte-kit", "coverage",
+    "__pycache__", ".pytest_cache", ".mypy_cache", ".tox", ".venv", "venv", "env", ".idea", ".vscode",
+}
+GENERATED_SUFFIXES = (".min.js", ".min.css", ".map", ".lock", "package-lock.json", "pnpm-lock.yaml", "npm-shrinkwrap.json")
+BINARY_EXTENSIONS = {
+    "png", "jpg", "jpeg", "gif", "webp", "ico", "bmp", "tiff", "psd", "mp3", "mp4", "wav", "ogg", "webm", "mov",
+    "woff", "woff2", "ttf", "otf", "eot", "pdf", "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "jar", "war",
+    "exe", "dll", "so", "dylib", "o", "a", "class", "pyc", "pyo", "wasm", "bin", "dat", "db", "sqlite", "sqlite3",
+}
+KINDS = {
+    "py": "python", "js": "javascript", "jsx": "javascript", "mjs": "javascript", "cjs": "javascript",
+    "ts": "typescript", "tsx": "typescript", "html": "html", "htm": "html", "css": "css", "scss": "css",
+    "json": "json", "md": "markdown", "yml": "yaml", "yaml": "yaml", "toml": "toml", "sh": "shell",
+    "go": "go", "rs": "rust", "java": "java", "rb": "ruby", "php": "php", "c": "c", "h": "c", "cpp": "cpp",
+}
+
+# Top-level symbols of non-Python files are found with one regex per extension, on unindented lines
+SYMBOL_PATTERNS = {
+    ext: r"^(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:function\s*\*?\s*(\w+)|class\s+(\w+)|(?:const|let|var)\s+(\w+)|(?:interface|type|enum)\s+(\w+))"
+    for ext in ("js", "jsx", "mjs", "cjs", "ts", "tsx")
+}
+SYMBOL_PATTERNS.update({
+    "go": r"^(?:func\s+(?:\([^)]*\)\s*)?(\w+)|type\s+(\w+))",
+    "rs": r"^(?:pub(?:\([^)]*\))?\s+)?(?:fn|struct|enum|trait|mod)\s+(\w+)",
+    "rb": r"^(?:class|module|def)\s+([\w.]+)",
+})
+MAX_SYMBOLS = 30
+# Symbols shown per file in the routing tree
+TREE_SYMBOLS = 6
+
+SCAN_PRUNED = metrics.REGISTRY.counter(
+    "agent_scan_pruned_total",
+    "Repository entries left out of the routing prompt, by rule.",
+    ("reason",)
+)
+
+# Runs inside the sandbox, so the listing, stats and line counts cost one round trip.
+# Wrapped in a function that deletes itself to keep the kernel's namespace clean.
+SCAN_SCRIPT = '''
+def _backspace_scan(repo_dir, vendor_dirs, generated_suffixes, binary_extensions, max_bytes, symbol_patterns, max_symbols):
+    import ast, os, re, stat, subprocess
+    vendor_dirs, binary_extensions = set(vendor_dirs), set(binary_extensions)
+
+    def symbols(extension, text):
+        if extension == "py":
+            try:
+                tree = ast.parse(text)
+            except (SyntaxError, ValueError):
+                return []
+            return [n.name for n in tree.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))][:max_symbols]
+        if extension not in symbol_patterns:
+            return []
+        pattern = re.compile(symbol_patterns[extension], re.MULTILINE)
+        return [next(g for g in m.groups() if g) for m in pattern.finditer(text) if any(m.groups())][:max_symbols]
+
+    def git(*args):
+        completed = subprocess.run(["git", "-c", "core.quotePath=false", *args], cwd=repo_dir, capture_output=True)
+        return [entry for entry in completed.stdout.decode("utf-8", "replace").split("\\0") if entry]
+
+    candidates = {}
+    for record in git("ls-files", "-z", "--stage"):
+        meta, _, path = record.partition("\\t")
+        candidates[path] = meta.split()[1]
+    for path in git("ls-files", "-z", "--others", "--exclude-standard"):
+        candidates.setdefault(path, None)
+
+    pruned = {"gitignore": len(git("ls-files", "-z", "--others", "--ignored", "--exclude-standard", "--directory"))}
+    files = []
+    for path, sha in candidates.items():
+        name = path.rsplit("/", 1)[-1].lower()
+        extension = name.rsplit(".", 1)[-1] if "." in name else ""
+        if vendor_dirs.intersection(path.split("/")[:-1]):
+            reason = "vendor"
+        elif name.endswith(tuple(generated_suffixes)):
+            reason = "generated"
+        elif extension in binary_extensions:
+            reason = "binary"
+        else:
+            reason = None
+            try:
+                info = os.lstat(os.path.join(repo_dir, path))
+            except OSError:
+                continue
+            if not stat.S_ISREG(info.st_mode):
+                reason = "special"
+            elif info.st_size > max_bytes:
+                reason = "too_large"
+            else:
+                with open(os.path.join(repo_dir, path), "rb") as f:
+                    data = f.read()
+                if b"\\0" in data[:8192]:
+                    reason = "binary"
+                else:
+                    lines = data.count(b"\\n") + (1 if data and not data.endswith(b"\\n") else 0)
+                    files.append([path, sha, info.st_size, lines, symbols(extension, data.decode("utf-8", "replace"))])
+        if reason:
+            pruned[reason] = pruned.get(reason, 0) + 1
+    return {"files": files, "pruned": pruned}
+
+print(__import__("json").dumps(_backspace_scan({args})))
+del _backspace_scan
+'''
+
+
+class RepoScan:
+    """
+    The files of a clone that are worth showing the LLM, with their blob SHA (None for
+    untracked files), size in bytes, kind, line count and top-level symbols, plus how many
+    entries were pruned and why. For a clean clone this is a map of the commit, so it can be cached.
+    """
+
+    def __init__(self, files, pruned, seconds):
+        self.files = files
+        self.pruned = pruned
+        self.seconds = seconds
+
+    @classmethod
+    def from_output(cls, output, seconds):
+        data = json.loads(output.strip().splitlines()[-1])
+        files = {
+            path: {"sha": sha, "size": size, "lines": lines, "kind": kind_of(path), "symbols": symbols}
+            for path, sha, size, lines, symbols in data["files"]
+        }
+        return cls(files, data["pruned"], seconds)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["files"], data["pruned"], data["seconds"])
+
+    def to_dict(self):
+        return {"files": self.files, "pruned": self.pruned, "seconds": self.seconds}
+
+    @property
+    def pruned_count(self):
+        return sum(self.pruned.values())
+
+    def sha(self, path):
+        entry = self.files.get(path)
+        return entry["sha"] if entry else None
+
+    def resolve(self, path):
+        """
+        Maps a path from the LLM's plan onto a scanned file: exact paths are kept, and a bare
+        or partial path is resolved when exactly one file ends with it. Unknown paths are returned as is.
+        """
+        path = path.strip()
+        path = path[2:] if path.startswith("./") else path
+        if path in self.files:
+            return path
+        matches = [p for p in self.files if p.endswith("/" + path)]
+        return matches[0] if len(matches) == 1 else path
+
+    def tree(self):
+        """
+        Renders the files as an indented tree with line counts and top-level symbols, e.g.
+
+            README.md (40 lines)
+            src/app/
+              main.py (120 lines): create_app, Config
+
+        Directories that only contain one directory are collapsed into a single line.
+        """
+        root = {}
+        for path in self.files:
+            node = root
+            *dirs, name = path.split("/")
+            for directory in dirs:
+                node = node.setdefault(directory + "/", {})
+            node[name] = path
+        out = []
+        self._render(root, "", out)
+        return "\n".join(out)
+
+    def _render(self, node, indent, out):
+        for name in sorted(k for k in node if not k.endswith("/")):
+            entry = self.files[node[name]]
+            line = f"{indent}{name} ({entry['lines']} lines)"
+            symbols = entry.get("symbols") or []
+            if symbols:
+                line += ": " + ", ".join(symbols[:TREE_SYMBOLS]) + (", ..." if len(symbols) > TREE_SYMBOLS else "")
+            out.append(line)
+        for name in sorted(k for k in node if k.endswith("/")):
+            child = node[name]
+            while len(child) == 1 and next(iter(child)).endswith("/"):
+                only = next(iter(child))
+                name += only
+                child = child[only]
+            out.append(f"{indent}{name}")
+            self._render(child, indent + "  ", out)
+
+    def summary(self):
+        return {
+            "files": len(self.files),
+            "lines": sum(entry["lines"] for entry in self.files.values()),
+            "pruned": self.pruned_count,
+            "pruned_by_rule": self.pruned,
+            "seconds": self.seconds,
+        }
+
+
+def kind_of(path):
+    name = path.rsplit("/", 1)[-1].lower()
+    return KINDS.get(name.rsplit(".", 1)[-1], "text") if "." in name else "text"
+
+
+def _rules(max_file_kb):
+    return (sorted(VENDOR_DIRS), list(GENERATED_SUFFIXES), sorted(BINARY_EXTENSIONS), int(max_file_kb * 1024), SYMBOL_PATTERNS, MAX_SYMBOLS)
+
+
+def rules_fingerprint(max_file_kb=SCAN_MAX_FILE_KB):
+    """Changes whenever the scan script or its rules do, so cached scans made under other rules aren't reused."""
+    return hashlib.sha1((SCAN_SCRIPT + json.dumps(_rules(max_file_kb))).encode("utf-8")).hexdigest()[:12]
+
+
+def scan(sbx, repo_dir, max_file_kb=SCAN_MAX_FILE_KB):
+    """Lists the clone's files, honouring .gitignore and the built-in vendor, generated and binary rules."""
+    args = ", ".join(json.dumps(value) for value in (repo_dir, *_rules(max_file_kb)))
+    script = SCAN_SCRIPT.replace("{args}", args)
+    started = time.perf_counter()
+    execution = run_code(sbx, script)
+    seconds = round(time.perf_counter() - started, 3)
+    if execution.error or not execution.logs.stdout:
+        detail = execution.error.value if execution.error else "no output"
+        raise RuntimeError(f"Repository scan failed: {detail}")
+    result = RepoScan.from_output("".join(execution.logs.stdout), seconds)
+    for reason, count in result.pruned.items():
+        if count:
+            SCAN_PRUNED.inc(count, reason=reason)
+    return result
@@ -0,0 +1,66 @@
+import ast
+import os
+
+import metrics
+
+# How many times a script that fails the precheck is sent back to the LLM for a fix
+SCRIPT_REPAIR_ATTEMPTS = int(os.getenv("SCRIPT_REPAIR_ATTEMPTS", "2"))
+
+SCRIPT_PRECHECKS = metrics.REGISTRY.counter(
+    "agent_script_precheck_total",
+    "Generated modification scripts by precheck outcome (ok, repaired or rejected).",
+    ("result",)
+)
+EXECUTIONS_AVOIDED = metrics.REGISTRY.counter(
+    "agent_sandbox_executions_avoided_total",
+    "Sandbox executions skipped because the generated script failed the host-side precheck."
+)
+
+
+def extract_script(text):
+    """Pulls the Python script out of an LLM answer that may wrap it in a Markdown code fence."""
+    if "```python" in text:
+        return text.split("```python")[1].split("```")[0]
+    if "```" in text:
+        return text.split("```")[1]
+    return text
+
+
+def precheck(script, file_path, file_content):
+    """
+    Compiles and statically checks a modification script on the host, so that scripts which
+    would certainly fail (or silently change nothing) never cost a sandbox round trip.
+    Returns a description of the first problem found, or None if the script looks runnable.
+    """
+    try:
+        tree = ast.parse(script)
+        compile(tree, "<modification script>", "exec")
+    except SyntaxError as e:
+        return f"SyntaxError on line {e.lineno}: {e.msg}"
+    except ValueError as e:
+        return f"Invalid script: {e}"
+
+    strings = [node.value for node in ast.walk(tree) if isinstance(node, ast.Constant) and isinstance(node.value, str)]
+    file_name = os.path.basename(file_path)
+    if not any(file_name in value for value in strings):
+        return f"The script never refers to the file {file_path}"
+
+    # str.replace() with a literal search string is the usual edit; if none of the searched
+    # strings occur in the file, the script can only leave it unchanged
+    searched = [
+        node.args[0].value for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "replace"
+        and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)
+    ]
+    if searched and not any(value in file_content for value in searched):
+        preview = searched[0] if len(searched[0]) <= 80 else searched[0][:77] + "..."
+        return f"None of the strings the script replaces occur in the file, e.g. {preview!r}"
+    return None
+
+
+def repair_prompt(problem):
+    return (
+        f"Your script can't be used: {problem}\n"
+        "Fix it and reply with the complete corrected Python script only. "
+        "Any string you search for must be copied exactly from the file content above."
+    )
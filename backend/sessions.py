@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+import uuid
+
+import executors
+import logs
+import sandbox
+
+# Sessions left without prompts for this long are closed and their sandbox killed
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "900"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "20"))
+# E2B sandboxes have a fixed lifetime, so a session's is kept at one idle window plus one prompt
+SESSION_SANDBOX_SECONDS = SESSION_IDLE_SECONDS + sandbox.SANDBOX_TIMEOUT
+
+
+class SessionError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Session:
+    """
+    One sandbox and one clone serving a series of prompts against the same repository.
+    Every prompt starts from the clean base commit, so the scan of that commit stays valid
+    and is cached across prompts (file contents come from the shared blob cache).
+    """
+
+    def __init__(self, repo_url, username, repo_name):
+        self.id = uuid.uuid4().hex[:12]
+        self.repo_url = repo_url
+        self.username = username
+        self.repo_name = repo_name
+        self.repo_dir = repo_name
+        self.sbx = None
+        self.base_sha = None
+        self.cache = {"scan": None}
+        self.prompts = 0
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.lock = asyncio.Lock()
+
+    @property
+    def busy(self):
+        return self.lock.locked()
+
+    async def reset(self):
+        """Puts the clone back on the base commit, dropping whatever the previous prompt changed."""
+        await sandbox.run_code_async(
+            self.sbx,
+            f"!( cd {self.repo_dir} && git checkout -q --detach {self.base_sha} && git reset -q --hard && git clean -fdq )"
+        )
+
+    async def keep_alive(self):
+        """Pushes the sandbox's end of life SESSION_SANDBOX_SECONDS away."""
+        try:
+            await executors.run_in(executors.SANDBOX_EXECUTOR, sandbox.set_timeout, self.sbx, SESSION_SANDBOX_SECONDS)
+        except Exception as e:
+            logs.warning("session_keep_alive_failed", f"⚠️ Could not extend the sandbox of session {self.id}: {e}", session_id=self.id)
+
+    async def run(self, events):
+        """Runs one prompt's pipeline, waiting for the previous prompt of the session to finish first."""
+        if self.busy:
+            yield "data: ⏳ Waiting for the previous prompt of this session to finish\n\n"
+        async with self.lock:
+            self.last_used = time.time()
+            await self.keep_alive()
+            try:
+                async for event in events:
+                    yield event
+            finally:
+                self.prompts += 1
+                self.last_used = time.time()
+                await self.keep_alive()
+
+    def to_dict(self):
+        return {
+            "session_id": self.id,
+            "repoUrl": self.repo_url,
+            "base_sha": self.base_sha,
+            "prompts": self.prompts,
+            "busy": self.busy,
+            "files": len(self.cache["scan"].files) if self.cache["scan"] else 0,
+            "idle_seconds": round(time.time() - self.last_used, 1),
+        }
+
+
+class SessionRegistry:
+    def __init__(self):
+        self.sessions = {}
+
+    async def open(self, repo_url, username, repo_name, clone_url):
+        """Starts a sandbox, clones the repository into it and records the base commit."""
+        self.expire()
+        if len(self.sessions) >= MAX_SESSIONS:
+            raise SessionError(f"Too many open sessions (limit {MAX_SESSIONS})", status_code=429)
+
+        session = Session(repo_url, username, repo_name)
+        session.sbx = await sandbox.create_async()
+        await session.keep_alive()
+        result = await sandbox.run_code_async(session.sbx, f"!( git clone {clone_url} )")
+        head = await sandbox.run_code_async(session.sbx, f"!( cd {session.repo_dir} && git rev-parse HEAD )")
+        session.base_sha = "".join(head.logs.stdout).strip()
+        if len(session.base_sha) != 40:
+            sandbox.kill_in_background(session.sbx)
+            raise SessionError("Could not clone repository: " + "".join(result.logs.stderr or result.logs.stdout)[-500:])
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        self.expire()
+        return self.sessions.get(session_id)
+
+    async def get_live(self, session_id):
+        """get(), but a session whose sandbox has died is closed and not returned."""
+        session = self.get(session_id)
+        if session is None or session.busy:
+            return session
+        if not await executors.run_in(executors.SANDBOX_EXECUTOR, sandbox.is_running, session.sbx):
+            logs.warning("session_sandbox_gone", f"⚠️ Sandbox of session {session.id} is gone, closing it", session_id=session.id)
+            self.close(session.id)
+            return None
+        return session
+
+    def close(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if session.busy:
+            raise SessionError("Session is running a prompt", status_code=409)
+        del self.sessions[session_id]
+        sandbox.kill_in_background(session.sbx)
+        return session
+
+    def expire(self):
+        now = time.time()
+        for session in list(self.sessions.values()):
+            if not session.busy and now - session.last_used > SESSION_IDLE_SECONDS:
+                logs.info("session_expired", f"⌛ Closing idle session {session.id}", session_id=session.id)
+                self.close(session.id)
+
+    def stats(self):
+        return {"open": len(self.sessions), "busy": sum(1 for s in self.sessions.values() if s.busy)}
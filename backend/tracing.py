@@ -0,0 +1,95 @@
+import contextvars
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Record a trace for every job, not only the ones that ask for it
+TRACE_ALL_JOBS = os.getenv("TRACE_ALL_JOBS", "").lower() in ("1", "true", "yes")
+
+_span_ids = itertools.count(1)
+
+
+class JobTrace:
+    """
+    Span tree for one job, exportable in the Chrome trace event format
+    (loadable in chrome://tracing and ui.perfetto.dev).
+    """
+
+    def __init__(self, name="agent-job"):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        events = [{
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "args": {"name": self.name},
+        }]
+        for span in sorted(spans, key=lambda span: span["start"]):
+            args = dict(span["args"])
+            args["span_id"] = span["id"]
+            if span["parent"]:
+                args["parent_id"] = span["parent"]
+            events.append({
+                "name": span["name"],
+                "cat": span["cat"],
+                "ph": "X",
+                "ts": round((span["start"] - self.started) * 1e6, 1),
+                "dur": round((span["end"] - span["start"]) * 1e6, 1),
+                "pid": pid,
+                "tid": span["tid"],
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+_current_trace = contextvars.ContextVar("job_trace", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+
+def activate(trace):
+    """Makes `trace` the destination of spans opened in this context and in worker threads it starts."""
+    _current_trace.set(trace)
+
+
+@contextmanager
+def span(name, cat="stage", **args):
+    """
+    Records a span in the current job's trace. Yields the span's args dict so callers can
+    attach results (status codes, token counts) before it closes. A no-op when tracing is off.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield {}
+        return
+
+    span_id = next(_span_ids)
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    started = time.perf_counter()
+    try:
+        yield args
+    finally:
+        _current_span.reset(token)
+        trace.add({
+            "id": span_id,
+            "parent": parent,
+            "name": name,
+            "cat": cat,
+            "start": started,
+            "end": time.perf_counter(),
+            "tid": threading.get_ident(),
+            "args": args,
+        })
@@ -0,0 +1,126 @@
+import contextvars
+import os
+import threading
+
+import logs
+import metrics
+
+# USD per million prompt and completion tokens; LLM_PRICE_INPUT / LLM_PRICE_OUTPUT override the table
+MODEL_PRICES = {
+    "gemma2-9b-it": (0.20, 0.20),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+}
+LLM_PRICE_INPUT = os.getenv("LLM_PRICE_INPUT")
+LLM_PRICE_OUTPUT = os.getenv("LLM_PRICE_OUTPUT")
+# Hard limits per job, 0 for none; a request's tokenBudget / costBudget takes precedence
+JOB_TOKEN_BUDGET = int(os.getenv("JOB_TOKEN_BUDGET", "0"))
+JOB_COST_BUDGET = float(os.getenv("JOB_COST_BUDGET", "0"))
+
+LLM_TOKENS = metrics.REGISTRY.counter(
+    "agent_llm_tokens_total",
+    "LLM tokens used, by kind (prompt or completion), stage and model.",
+    ("kind", "stage", "model")
+)
+LLM_COST = metrics.REGISTRY.counter(
+    "agent_llm_cost_usd_total",
+    "Estimated LLM cost in US dollars, by stage and model.",
+    ("stage", "model")
+)
+BUDGET_EXCEEDED = metrics.REGISTRY.counter(
+    "agent_llm_budget_exceeded_total",
+    "Jobs stopped for going over their token or cost budget, by budget.",
+    ("budget",)
+)
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def price(model):
+    """Returns (input, output) USD per million tokens for `model`."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    if LLM_PRICE_INPUT is not None:
+        input_price = float(LLM_PRICE_INPUT)
+    if LLM_PRICE_OUTPUT is not None:
+        output_price = float(LLM_PRICE_OUTPUT)
+    return input_price, output_price
+
+
+def cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = price(model)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class JobUsage:
+    """
+    Token counts and estimated cost of one job's LLM calls, per stage. With a budget set, the
+    call that goes over it raises BudgetExceeded, and so does every later call before it is sent.
+    """
+
+    def __init__(self, token_budget=None, cost_budget=None):
+        self.token_budget = JOB_TOKEN_BUDGET if token_budget is None else token_budget
+        self.cost_budget = JOB_COST_BUDGET if cost_budget is None else cost_budget
+        self.stages = {}
+        self.exceeded = None
+        self._lock = threading.Lock()
+
+    def record(self, stage, model, prompt_tokens, completion_tokens):
+        # Window edits are staged as edit_window:<line>; one stage per kind of call keeps labels bounded
+        stage = stage.split(":", 1)[0]
+        call_cost = cost(model, prompt_tokens, completion_tokens)
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt", stage=stage, model=model)
+        LLM_TOKENS.inc(completion_tokens, kind="completion", stage=stage, model=model)
+        LLM_COST.inc(call_cost, stage=stage, model=model)
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cost_usd"] += call_cost
+            tokens, total_cost = self._totals()
+            if self.exceeded is None:
+                if self.token_budget and tokens > self.token_budget:
+                    self.exceeded = ("tokens", f"token budget of {self.token_budget} exceeded ({tokens} tokens used)")
+                elif self.cost_budget and total_cost > self.cost_budget:
+                    self.exceeded = ("cost", f"cost budget of ${self.cost_budget} exceeded (${total_cost:.4f} spent)")
+                if self.exceeded is not None:
+                    BUDGET_EXCEEDED.inc(budget=self.exceeded[0])
+                    logs.warning("llm_budget_exceeded", f"💸 {self.exceeded[1]}", budget=self.exceeded[0])
+        self.check()
+
+    def check(self):
+        """Raises BudgetExceeded once the job has gone over a budget."""
+        if self.exceeded is not None:
+            raise BudgetExceeded(self.exceeded[1])
+
+    def _totals(self):
+        tokens = sum(e["prompt_tokens"] + e["completion_tokens"] for e in self.stages.values())
+        return tokens, sum(e["cost_usd"] for e in self.stages.values())
+
+    def summary(self):
+        with self._lock:
+            stages = {stage: {**entry, "cost_usd": round(entry["cost_usd"], 6)} for stage, entry in self.stages.items()}
+            tokens, total_cost = self._totals()
+        return {
+            "calls": sum(e["calls"] for e in stages.values()),
+            "prompt_tokens": sum(e["prompt_tokens"] for e in stages.values()),
+            "completion_tokens": sum(e["completion_tokens"] for e in stages.values()),
+            "total_tokens": tokens,
+            "cost_usd": round(total_cost, 6),
+            "stages": stages,
+            "budget": {"tokens": self.token_budget or None, "cost_usd": self.cost_budget or None,
+                       "exceeded": self.exceeded[0] if self.exceeded else None},
+        }
+
+
+_current = contextvars.ContextVar("job_usage", default=None)
+
+
+def activate(job_usage):
+    _current.set(job_usage)
+
+
+def current():
+    return _current.get()
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import shlex
+import tempfile
+import threading
+import time
+
+import cassette
+import logs
+import metrics
+import progress
+import sandbox
+from sandbox import run_code, upload, download
+
+# Run the verification stage on jobs that don't say whether they want it
+VERIFY_DEFAULT = os.getenv("VERIFY_DEFAULT", "false").lower() in ("1", "true", "yes")
+# ";"-separated commands run in a copy of the edited clone; empty picks defaults from the lockfiles found
+VERIFY_COMMANDS = [command.strip() for command in os.getenv("VERIFY_COMMANDS", "").split(";") if command.strip()]
+VERIFY_TIMEOUT = int(os.getenv("VERIFY_TIMEOUT", "300"))
+# "report" streams failures and pushes anyway, "block" stops the job before anything is pushed
+VERIFY_FAIL_POLICY = os.getenv("VERIFY_FAIL_POLICY", "report").lower()
+# Lines of each command's output sent over SSE
+VERIFY_OUTPUT_LINES = int(os.getenv("VERIFY_OUTPUT_LINES", "20"))
+DEPS_CACHE_DIR = os.getenv("DEPS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "backspace-agent-deps"))
+DEPS_CACHE_MB = float(os.getenv("DEPS_CACHE_MB", "2048"))
+# Installed dependencies bigger than this are used for the job but not cached
+DEPS_CACHE_ENTRY_MB = float(os.getenv("DEPS_CACHE_ENTRY_MB", "512"))
+
+DEPS_LOOKUPS = metrics.REGISTRY.counter(
+    "agent_dependency_cache_lookups_total",
+    "Dependency cache lookups by ecosystem and result (hit, miss or bypass).",
+    ("ecosystem", "result")
+)
+DEPS_SECONDS_SAVED = metrics.REGISTRY.counter(
+    "agent_dependency_cache_seconds_saved_total",
+    "Install time avoided by restoring cached dependencies, net of the restore itself."
+)
+
+# Per ecosystem: the lockfile that keys the cache, the command reporting the runtime version, and
+# where its dependencies are installed ({work} is the copy of the clone, {base} its parent directory)
+ECOSYSTEMS = {
+    "npm": {
+        "lockfile": "package-lock.json",
+        "runtime": "node -v",
+        "target": "{work}/node_modules",
+        "install": "npm ci --no-audit --no-fund --prefer-offline",
+    },
+    "pip": {
+        "lockfile": "requirements.txt",
+        "runtime": "python3 -V",
+        # Virtualenvs aren't relocatable, so the venv lives at the same path in every sandbox
+        "target": "{base}/venv",
+        "install": "python3 -m venv {base}/venv && {base}/venv/bin/pip install -q --disable-pip-version-check -r requirements.txt",
+    },
+}
+
+# Runs inside the sandbox: hashes the lockfiles and reports runtime versions in one round trip
+PROBE_SCRIPT = '''
+def _backspace_probe(repo_dir, ecosystems):
+    import hashlib, os, platform, subprocess
+    found = {}
+    for name, (lockfile, runtime) in ecosystems.items():
+        path = os.path.join(repo_dir, lockfile)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        try:
+            version = subprocess.run(runtime, shell=True, capture_output=True, text=True, timeout=30).stdout.strip()
+        except Exception:
+            version = ""
+        found[name] = {"lockfile": hashlib.sha256(data).hexdigest(), "runtime": version, "pytest": b"pytest" in data.lower()}
+    return {"workdir": os.getcwd(), "arch": platform.machine(), "ecosystems": found}
+
+print(__import__("json").dumps(_backspace_probe({args})))
+del _backspace_probe
+'''
+
+
+class DependencyCache:
+    """
+    Tarballs of installed dependencies (node_modules, a virtualenv) on the host, keyed by
+    ecosystem, lockfile hash, runtime version and architecture, so a sandbox restores them
+    instead of installing. Each entry remembers how long its install took, which is what a
+    hit saves. The store has a byte budget enforced by LRU on file mtimes and is shared by
+    every worker process on the host.
+    """
+
+    def __init__(self, disk_dir=DEPS_CACHE_DIR, disk_bytes=DEPS_CACHE_MB * 1024 * 1024):
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.stats_counts = {"hit": 0, "miss": 0, "bypass": 0}
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.disk_dir, f"{key}{suffix}")
+
+    def get(self, key):
+        """Returns (tarball path, install seconds) of a cached entry, or None."""
+        path = self._path(key, ".tar.gz")
+        try:
+            with open(self._path(key, ".json")) as f:
+                meta = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return path, meta.get("install_seconds", 0.0)
+
+    def put(self, key, data, install_seconds):
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key, ".tar.gz"))
+            with open(self._path(key, ".json"), "w") as f:
+                json.dump({"install_seconds": install_seconds, "bytes": len(data)}, f)
+        except OSError as e:
+            logs.warning("deps_cache_write_failed", f"⚠️ Could not store dependencies {key}: {e}")
+            return
+        self._evict()
+
+    def record(self, ecosystem, result, seconds_saved=0.0):
+        with self._lock:
+            self.stats_counts[result] += 1
+            self.seconds_saved += seconds_saved
+        DEPS_LOOKUPS.inc(ecosystem=ecosystem, result=result)
+        if seconds_saved:
+            DEPS_SECONDS_SAVED.inc(seconds_saved)
+
+    def _entries(self):
+        """Returns [(mtime, size, key)] of the stored tarballs."""
+        if not os.path.isdir(self.disk_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".tar.gz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.disk_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-len(".tar.gz")]))
+        return entries
+
+    def _evict(self):
+        """Deletes the least recently used entries until the store is back under 90% of its budget."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        if total <= self.disk_bytes:
+            return
+        for _, size, key in entries:
+            if total <= self.disk_bytes * 0.9:
+                break
+            for suffix in (".json", ".tar.gz"):
+                try:
+                    os.remove(self._path(key, suffix))
+                except OSError:
+                    pass
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            lookups = self.stats_counts["hit"] + self.stats_counts["miss"]
+            return {
+                **self.stats_counts,
+                "hit_rate": round(self.stats_counts["hit"] / lookups, 4) if lookups else 0.0,
+                "seconds_saved": round(self.seconds_saved, 3),
+                "entries": len(entries),
+                "disk_bytes": sum(size for _, size, _ in entries),
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """Returns the process-wide cache, created on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = DependencyCache()
+        return _shared
+
+
+def _shell(sbx, command):
+    """Runs a shell command in the sandbox; returns (exit code, output lines with stderr merged in)."""
+    execution = run_code(sbx, f'!( ( {command} ) 2>&1; echo "__exit=$?" )')
+    lines = "".join(execution.logs.stdout + execution.logs.stderr).splitlines()
+    # Output the kernel delivers out of order may still land after the marker, so look for it
+    for i in range(len(lines) - 1, -1, -1):
+        if lines[i].startswith("__exit=") and lines[i][len("__exit="):].isdigit():
+            return int(lines.pop(i)[len("__exit="):]), lines
+    return 1, lines
+
+
+def probe(sbx, repo_dir):
+    args = ", ".join(json.dumps(value) for value in (
+        repo_dir, {name: (eco["lockfile"], eco["runtime"]) for name, eco in ECOSYSTEMS.items()}
+    ))
+    execution = run_code(sbx, PROBE_SCRIPT.replace("{args}", args))
+    if execution.error or not execution.logs.stdout:
+        detail = execution.error.value if execution.error else "no output"
+        raise RuntimeError(f"Verification probe failed: {detail}")
+    return json.loads("".join(execution.logs.stdout).strip().splitlines()[-1])
+
+
+def default_commands(found):
+    commands = []
+    if "npm" in found:
+        commands.append("npm test --if-present")
+    if "pip" in found:
+        commands.append("python -m pytest -q" if found["pip"]["pytest"] else "python -m compileall -q .")
+    return commands
+
+
+def install(sbx, name, info, arch, base, work, cache):
+    """Restores or installs one ecosystem's dependencies; returns a summary for the verify event."""
+    eco = ECOSYSTEMS[name]
+    target = eco["target"].format(base=base, work=work)
+    key = hashlib.sha256(f"{name}|{info['lockfile']}|{info['runtime']}|{arch}|{target}".encode("utf-8")).hexdigest()[:32]
+    parent, folder = os.path.dirname(target), os.path.basename(target)
+    tarball = f"{base}/{key}.tar.gz"
+    # Recorded jobs must contain every sandbox call, so cassettes always install
+    use_cache = cassette.current() is None
+    started = time.perf_counter()
+
+    entry = cache.get(key) if use_cache else None
+    if entry is not None:
+        path, install_seconds = entry
+        with open(path, "rb") as f:
+            upload(sbx, tarball, f)
+        code, lines = _shell(sbx, f"mkdir -p {parent} && tar -xzf {tarball} -C {parent} && rm -f {tarball}")
+        if code == 0:
+            seconds = round(time.perf_counter() - started, 3)
+            saved = max(0.0, install_seconds - seconds)
+            cache.record(name, "hit", saved)
+            progress.emit("dependencies", f"♻️ Restored {name} dependencies in {seconds}s (saved {saved:.1f}s)",
+                          ecosystem=name, cached=True, seconds=seconds, seconds_saved=round(saved, 3))
+            return {"ecosystem": name, "cached": True, "ok": True, "seconds": seconds, "seconds_saved": round(saved, 3)}
+        logs.warning("deps_restore_failed", f"⚠️ Could not restore cached {name} dependencies, installing", output=lines[-5:])
+        started = time.perf_counter()
+
+    cache.record(name, "miss" if use_cache else "bypass")
+    progress.emit("dependencies", f"📦 Installing {name} dependencies...", ecosystem=name, cached=False)
+    command = eco["install"].format(base=base, work=work)
+    code, lines = _shell(sbx, f"cd {work} && timeout {VERIFY_TIMEOUT} bash -c {shlex.quote(command)}")
+    seconds = round(time.perf_counter() - started, 3)
+    if code != 0:
+        progress.emit("dependencies", f"❌ Installing {name} dependencies failed", ecosystem=name,
+                      cached=False, ok=False, output=lines[-VERIFY_OUTPUT_LINES:])
+        return {"ecosystem": name, "cached": False, "ok": False, "seconds": seconds}
+
+    if use_cache:
+        code, lines = _shell(sbx, f"tar -czf {tarball} -C {parent} {folder} && stat -c %s {tarball}")
+        size = int(lines[-1]) if code == 0 and lines and lines[-1].isdigit() else None
+        if size is not None and size <= DEPS_CACHE_ENTRY_MB * 1024 * 1024:
+            cache.put(key, download(sbx, tarball), seconds)
+        elif size is not None:
+            logs.info("deps_too_large", f"📦 {name} dependencies are {size // (1024 * 1024)} MB, not caching them")
+        _shell(sbx, f"rm -f {tarball}")
+    progress.emit("dependencies", f"✅ Installed {name} dependencies in {seconds}s", ecosystem=name, cached=False, seconds=seconds)
+    return {"ecosystem": name, "cached": False, "ok": True, "seconds": seconds, "seconds_saved": 0.0}
+
+
+def run(sbx, repo_dir, commands=None, cache=None):
+    """
+    Runs the repository's own checks on the edited clone and returns a report. The checks run
+    on a copy of the clone, so installed dependencies and test artifacts never reach the commit.
+    """
+    cache = cache or shared()
+    started = time.perf_counter()
+    found = probe(sbx, repo_dir)
+    base = f"{found['workdir']}/.agent-verify"
+    work = f"{base}/{os.path.basename(repo_dir.rstrip('/'))}"
+    commands = commands or VERIFY_COMMANDS or default_commands(found["ecosystems"])
+    if not commands:
+        progress.emit("verify", "🧪 Nothing to verify: no commands configured and no known lockfile", passed=True, commands=[])
+        return {"passed": True, "commands": [], "dependencies": [], "seconds": 0.0}
+
+    # Installs and commands may each take VERIFY_TIMEOUT; the sandbox must outlive them and the push after
+    sandbox.set_timeout(sbx, VERIFY_TIMEOUT * (len(found["ecosystems"]) + len(commands)) + sandbox.SANDBOX_TIMEOUT)
+    try:
+        code, lines = _shell(sbx, f"rm -rf {work} && mkdir -p {base} && cp -a {repo_dir} {work}")
+        if code != 0:
+            raise RuntimeError(f"Could not copy the clone for verification: {' '.join(lines[-3:])}")
+
+        dependencies = []
+        for name, info in found["ecosystems"].items():
+            if not info["runtime"]:
+                logs.warning("verify_runtime_missing", f"⚠️ No runtime for {name} in the sandbox, skipping its dependencies")
+                continue
+            dependencies.append(install(sbx, name, info, found["arch"], base, work, cache))
+
+        results = []
+        path = f"{base}/venv/bin:$PATH"
+        for command in commands:
+            command_started = time.perf_counter()
+            code, lines = _shell(sbx, f"cd {work} && PATH={path} timeout {VERIFY_TIMEOUT} bash -c {shlex.quote(command)}")
+            status = "passed" if code == 0 else "timeout" if code == 124 else "failed"
+            result = {"command": command, "status": status, "exit_code": code,
+                      "seconds": round(time.perf_counter() - command_started, 3), "output": lines[-VERIFY_OUTPUT_LINES:]}
+            results.append(result)
+            icon = "✅" if status == "passed" else "❌"
+            progress.emit("verify_command", f"{icon} {command}: {status} in {result['seconds']}s", **result)
+    finally:
+        _shell(sbx, f"rm -rf {base}")
+
+    restored = [d for d in dependencies if d["cached"]]
+    report = {
+        "passed": all(r["status"] == "passed" for r in results),
+        "commands": [{k: v for k, v in r.items() if k != "output"} for r in results],
+        "dependencies": dependencies,
+        "cache": {
+            "hit_rate": round(len(restored) / len(dependencies), 4) if dependencies else 0.0,
+            "seconds_saved": round(sum(d.get("seconds_saved", 0.0) for d in dependencies), 3),
+        },
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    failed = [r["command"] for r in results if r["status"] != "passed"]
+    message = "✅ Verification passed" if report["passed"] else f"❌ Verification failed: {', '.join(failed)}"
+    progress.emit("verify", f"{message} ({report['seconds']}s, {report['cache']['seconds_saved']}s saved by the dependency cache)", **report)
+    return report
@@ -0,0 +1,242 @@
+import ast
+import contextvars
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+import metrics
+import progress
+from llm import chat
+
+# Files longer than this are edited window by window instead of being sent to the LLM whole
+WINDOW_EDIT_THRESHOLD_LINES = int(os.getenv("WINDOW_EDIT_THRESHOLD_LINES", "400"))
+# Read-only lines shown above and below each editable window
+WINDOW_CONTEXT_LINES = int(os.getenv("WINDOW_CONTEXT_LINES", "20"))
+WINDOW_MAX_LINES = int(os.getenv("WINDOW_MAX_LINES", "150"))
+MAX_WINDOWS = int(os.getenv("MAX_WINDOWS", "4"))
+
+# Half the height of a window opened around a search hit that isn't inside a small enough symbol
+HIT_RADIUS = 15
+
+STOPWORDS = {
+    "about", "above", "after", "also", "change", "changes", "code", "file", "files", "from", "have",
+    "into", "make", "more", "only", "should", "that", "their", "them", "then", "there", "these",
+    "this", "update", "when", "where", "which", "with", "would", "your", "please", "instead", "using",
+}
+
+JS_SYMBOL = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?"
+    r"(?:function\s*\*?\s*(\w+)|class\s+(\w+)|(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>|\w+\s*=>))"
+)
+
+
+def should_window(content):
+    return content.count("\n") + 1 > WINDOW_EDIT_THRESHOLD_LINES
+
+
+def find_symbols(filename, lines):
+    """Returns [(name, start, end)] with 0-based, end-exclusive line ranges of functions and classes."""
+    if filename.endswith(".py"):
+        try:
+            tree = ast.parse("".join(lines))
+        except SyntaxError:
+            return []
+        return [
+            (node.name, min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1, node.end_lineno)
+            for node in ast.walk(tree)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        ]
+
+    symbols = []
+    for i, line in enumerate(lines):
+        match = JS_SYMBOL.match(line)
+        if not match:
+            continue
+        name = next(group for group in match.groups() if group)
+        # The symbol ends where the braces opened on its first line are balanced again
+        depth = 0
+        opened = False
+        end = i + 1
+        for j in range(i, len(lines)):
+            depth += lines[j].count("{") - lines[j].count("}")
+            opened = opened or "{" in lines[j]
+            end = j + 1
+            if opened and depth <= 0:
+                break
+        symbols.append((name, i, end))
+    return symbols
+
+
+def search_terms(text):
+    """Quoted strings are searched verbatim, other words case-insensitively."""
+    quoted = [q for pair in re.findall(r"`([^`]+)`|\"([^\"]+)\"|'([^']+)'", text) for q in pair if q]
+    words = {w.lower() for w in re.findall(r"[A-Za-z_][\w\-]{3,}", text)} - STOPWORDS
+    return quoted, words
+
+
+def locate_windows(filename, lines, edit_prompt, reason=""):
+    """
+    Picks the regions of the file the edit is about: symbols named in the prompt, then lines that
+    match its quoted strings or words. Returns merged, non-overlapping [start, end) ranges.
+    """
+    symbols = find_symbols(filename, lines)
+    quoted, words = search_terms(f"{edit_prompt}\n{reason}")
+    ranges = []
+
+    named = set()
+    for name, start, end in symbols:
+        if name.lower() in words and end - start <= WINDOW_MAX_LINES:
+            ranges.append((start, end, 100))
+            named.add(name.lower())
+
+    line_words = [set(re.findall(r"[\w\-]+", line.lower())) for line in lines]
+    # Words that name a symbol are already covered, and words that occur all over the file don't tell us where to edit
+    useful = [
+        w for w in words - named
+        if sum(w in found for found in line_words) <= max(3, len(lines) // 20)
+    ]
+    for i, line in enumerate(lines):
+        score = sum(10 for q in quoted if q in line) + sum(1 for w in useful if w in line_words[i])
+        if not score:
+            continue
+        enclosing = [(s, e) for _, s, e in symbols if s <= i < e and e - s <= WINDOW_MAX_LINES]
+        if enclosing:
+            start, end = min(enclosing, key=lambda r: r[1] - r[0])
+        else:
+            start, end = max(0, i - HIT_RADIUS), min(len(lines), i + HIT_RADIUS + 1)
+        ranges.append((start, end, score))
+
+    # Hits inside the same symbol share its range; keep each range once, at its best score
+    scores = {}
+    for start, end, score in ranges:
+        scores[(start, end)] = max(score, scores.get((start, end), 0))
+    best = sorted(scores, key=lambda r: -scores[r])[:MAX_WINDOWS]
+    return merge_ranges(best)
+
+
+def merge_ranges(ranges):
+    """
+    Sorts ranges and merges the ones that overlap, as long as the merged window stays within
+    WINDOW_MAX_LINES; otherwise the overlap is trimmed off the later range.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start < merged[-1][1]:
+            last_start, last_end = merged[-1]
+            if max(end, last_end) - last_start <= WINDOW_MAX_LINES:
+                merged[-1] = (last_start, max(end, last_end))
+                continue
+            start = last_end
+            if start >= end:
+                continue
+        merged.append((start, end))
+    return merged
+
+
+def locate_with_llm(client, filename, lines, edit_prompt):
+    """Fallback when nothing matched: asks the LLM which of the file's symbols the edit touches."""
+    symbols = [s for s in find_symbols(filename, lines) if s[2] - s[1] <= WINDOW_MAX_LINES]
+    if not symbols:
+        return []
+    outline = "\n".join(f"{name} (lines {start + 1}-{end})" for name, start, end in symbols)
+    response = chat(
+        client,
+        [
+            {"role": "system", "content": "You locate code. Respond ONLY with a JSON list of symbol names."},
+            {"role": "user", "content": f"Which of these symbols in {filename} must change for this request?\n\nRequest:\n{edit_prompt}\n\nSymbols:\n{outline}"}
+        ],
+        stage="locate_window"
+    )
+    match = re.search(r"\[.*\]", response.choices[0].message.content, re.DOTALL)
+    try:
+        names = set(json.loads(match.group())) if match else set()
+    except ValueError:
+        names = set()
+    return merge_ranges([(start, end) for name, start, end in symbols if name in names])[:MAX_WINDOWS]
+
+
+def extract_block(text):
+    """Returns the contents of the first Markdown code block in `text` minus the language tag, or None if there is none."""
+    if text.count("```") < 2:
+        return None
+    block = text.split("```")[1]
+    first, _, rest = block.partition("\n")
+    return rest if first.strip() and " " not in first.strip() else block.lstrip("\n")
+
+
+def edit_window(client, filename, lines, start, end, edit_prompt):
+    """Sends one window, with read-only context around it, and returns its rewritten lines."""
+    before = "".join(lines[max(0, start - WINDOW_CONTEXT_LINES):start])
+    region = "".join(lines[start:end])
+    after = "".join(lines[end:end + WINDOW_CONTEXT_LINES])
+    prompt = f"""
+File: {filename} (lines {start + 1}-{end} of {len(lines)})
+
+Context before (read-only):
+```
+{before}```
+
+EDITABLE REGION:
+```
+{region}```
+
+Context after (read-only):
+```
+{after}```
+
+User request:
+{edit_prompt}
+
+Rewrite the EDITABLE REGION to fulfil the request. Reply with the complete rewritten region in one code block.
+If the region needs no change, return it unchanged.
+""".strip()
+    with metrics.stage("window_edit"):
+        response = chat(
+            client,
+            [
+                {"role": "system", "content": "You're a code-editing assistant working on one region of a large file. Keep indentation and style."},
+                {"role": "user", "content": prompt}
+            ],
+            stage=f"edit_window:{start + 1}"
+        )
+    edited = extract_block(response.choices[0].message.content)
+    if edited is None:
+        # Without a code block the reply is prose ("no change needed"), not code to splice in
+        logs.warning("window_reply_unfenced", f"⚠️ No code block in the reply for {filename} lines {start + 1}-{end}, keeping them")
+        return lines[start:end]
+    if region.endswith("\n") and not edited.endswith("\n"):
+        edited += "\n"
+    return edited.splitlines(keepends=True)
+
+
+def edit_in_windows(client, filename, content, edit_prompt, reason=""):
+    """
+    Edits a large file by sending only the relevant windows to the LLM, concurrently, and splicing
+    the results back. Returns the new content, or None if no window could be located.
+    """
+    lines = content.splitlines(keepends=True)
+    windows = locate_windows(filename, lines, edit_prompt, reason) or locate_with_llm(client, filename, lines, edit_prompt)
+    if not windows:
+        return None
+
+    sent = sum(end - start for start, end in windows)
+    progress.emit(
+        "windows", f"🪟 Editing {filename} in {len(windows)} window(s), {sent} of {len(lines)} lines",
+        file=filename, windows=[[start + 1, end] for start, end in windows], total_lines=len(lines)
+    )
+
+    # Windows don't overlap, so they can be edited at the same time; each worker runs in a copy
+    # of this thread's context so the job's trace, cassette and cancel scope still apply
+    with ThreadPoolExecutor(max_workers=len(windows)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, edit_window, client, filename, lines, start, end, edit_prompt)
+            for start, end in windows
+        ]
+        edits = [future.result() for future in futures]
+
+    # Splice from the bottom up so earlier line numbers stay valid
+    for (start, end), edited in sorted(zip(windows, edits), key=lambda item: -item[0][0]):
+        lines[start:end] = edited
+    return "".join(lines)
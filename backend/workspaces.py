@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+
+import executors
+import logs
+import sandbox
+
+# How long a finished job's sandbox is kept for follow-up edits on its branch
+WORKSPACE_IDLE_SECONDS = float(os.getenv("WORKSPACE_IDLE_SECONDS", "600"))
+MAX_WORKSPACES = int(os.getenv("MAX_WORKSPACES", "20"))
+
+
+class WorkspaceCache:
+    """
+    Sandboxes left behind by finished jobs, keyed by the branch their clone has checked out.
+    A follow-up edit on that branch takes the sandbox instead of cloning again. Entries expire
+    after WORKSPACE_IDLE_SECONDS; the oldest are killed when there are more than MAX_WORKSPACES.
+    """
+
+    def __init__(self, idle_seconds=WORKSPACE_IDLE_SECONDS, limit=MAX_WORKSPACES):
+        self.idle_seconds = idle_seconds
+        self.limit = limit
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(username, repo_name, branch_name):
+        return f"{username}/{repo_name}#{branch_name}".lower()
+
+    async def put(self, username, repo_name, branch_name, sbx):
+        # E2B sandboxes have a fixed lifetime; make it outlast the idle window, or most entries die unused
+        try:
+            await executors.run_in(executors.SANDBOX_EXECUTOR, sandbox.set_timeout, sbx, self.idle_seconds + sandbox.SANDBOX_TIMEOUT)
+        except Exception as e:
+            logs.warning("workspace_keep_alive_failed", f"⚠️ Could not extend the sandbox of {branch_name}, not keeping it: {e}")
+            sandbox.kill_in_background(sbx)
+            return
+        evicted = []
+        with self._lock:
+            key = self._key(username, repo_name, branch_name)
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                evicted.append(previous[0])
+            self.entries[key] = (sbx, time.time())
+            evicted.extend(self._expired())
+            while len(self.entries) > self.limit:
+                oldest = min(self.entries, key=lambda k: self.entries[k][1])
+                evicted.append(self.entries.pop(oldest)[0])
+        for old in evicted:
+            sandbox.kill_in_background(old)
+
+    async def take(self, username, repo_name, branch_name):
+        """Removes and returns the live sandbox for the branch, or None."""
+        with self._lock:
+            expired = self._expired()
+            entry = self.entries.pop(self._key(username, repo_name, branch_name), None)
+        for old in expired:
+            sandbox.kill_in_background(old)
+        sbx = entry[0] if entry else None
+        if sbx is not None and not await executors.run_in(executors.SANDBOX_EXECUTOR, sandbox.is_running, sbx):
+            sbx = None
+        if sbx is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return sbx
+
+    def _expired(self):
+        now = time.time()
+        stale = [key for key, (_, stored) in self.entries.items() if now - stored > self.idle_seconds]
+        return [self.entries.pop(key)[0] for key in stale]
+
+    def stats(self):
+        return {"cached": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -21,6 +21,8 @@ export async function GET(request) {
         'Content-Type': 'application/json',
       },
       body: JSON.stringify({ repoUrl, prompt }),
+      // Closing the tab aborts the backend request, so the job sees its client disconnect
+      signal: request.signal,
     });
 
     if (!response.ok) {
@@ -28,20 +30,30 @@ export async function GET(request) {
     }
 
     // Stream the response back to the frontend
+    const reader = response.body.getReader();
+    request.signal.addEventListener('abort', () => reader.cancel().catch(() => {}));
+
     const stream = new ReadableStream({
       async start(controller) {
-        const reader = response.body.getReader();
-        
         try {
           while (true) {
             const { done, value } = await reader.read();
             if (done) break;
             controller.enqueue(value);
           }
+        } catch (error) {
+          // The browser disconnected and the upstream read was cancelled
         } finally {
-          controller.close();
+          try {
+            controller.close();
+          } catch (error) {
+            // Already closed by cancel()
+          }
         }
       },
+      cancel() {
+        return reader.cancel();
+      },
     });
 
     return new NextResponse(stream, {